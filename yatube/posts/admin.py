@@ -1,14 +1,24 @@
 from django.contrib import admin
 
+from .forms import PostForm
 from .models import Group, Post
+from .search import filter_queryset
 
 
 class PostAdmin(admin.ModelAdmin):
+    # Форма сайта проверяет картинку, в том числе урезанную загрузку
+    # больше POST_IMAGE_MAX_BYTES.
+    form = PostForm
+    fields = ('text', 'author', 'group', 'image')
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     search_fields = ('text', )
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идет через полнотекстовый индекс, а не LIKE.
+        return filter_queryset(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug')
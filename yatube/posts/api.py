@@ -0,0 +1,180 @@
+import hashlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from . import comments
+from .feed import TimelineFeed
+from .models import Group, GroupCounter, Post, User, UserCounter
+from .paginator import paginate
+from .views import POSTS_PER_PAGE
+
+
+def post_image(post):
+    if not post.image:
+        return None
+    return {'url': post.image.url, 'width': post.image_width,
+            'height': post.image_height}
+
+
+# Поля поста в ответе API: имя -> функция от поста. Посты берутся теми
+# же запросами, что и в HTML-ленте (Post.objects.for_feed), поэтому
+# автор, группа и число комментариев не требуют отдельных запросов.
+POST_FIELDS = {
+    'id': lambda post: post.id,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group else None,
+    'image': post_image,
+    'comment_count': lambda post: post.comment_count,
+    'url': lambda post: reverse('post', args=(post.author.username,
+                                              post.id)),
+}
+
+
+def parse_fields(request):
+    """Поля из параметра fields=id,text,...; без него - все поля.
+    Для неизвестного поля возвращает None.
+    """
+    value = request.GET.get('fields')
+    if not value:
+        return list(POST_FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    if not fields or any(name not in POST_FIELDS for name in fields):
+        return None
+    return fields
+
+
+def serialize_post(post, fields):
+    return {name: POST_FIELDS[name](post) for name in fields}
+
+
+def page_link(request, name, cursor):
+    """Ссылка на соседнюю страницу с тем же fields."""
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    for key in ('page', 'after', 'before'):
+        query.pop(key, None)
+    query[name] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def json_response(request, data, status=200):
+    """JsonResponse с ETag по телу ответа; для совпадающего
+    If-None-Match отдается 304 без тела.
+    """
+    response = JsonResponse(data, status=status, encoder=DjangoJSONEncoder,
+                            json_dumps_params={'ensure_ascii': False})
+    if status != 200:
+        return response
+    etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+    response['ETag'] = etag
+    response['Vary'] = 'Cookie'
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def error_response(request, detail, status):
+    return json_response(request, {'detail': detail}, status)
+
+
+def fields_error(request):
+    return error_response(
+        request, f'Допустимые поля: {", ".join(POST_FIELDS)}.', 400)
+
+
+def comments_data(comment_list, next_cursor, username, post_id):
+    """Страница комментариев и ссылка на следующую (post_comments)."""
+    next_url = None
+    if next_cursor:
+        next_url = (reverse('api_post_comments', args=(username, post_id))
+                    + f'?after={next_cursor}')
+    return {
+        'results': [
+            {'id': comment.id, 'author': comment.author.username,
+             'text': comment.text, 'created': comment.created}
+            for comment in comment_list
+        ],
+        'next': next_url,
+    }
+
+
+def feed_response(request, object_list, **extra):
+    """Страница ленты object_list в JSON с курсорами соседних страниц."""
+    fields = parse_fields(request)
+    if fields is None:
+        return fields_error(request)
+    page = paginate(request, object_list, POSTS_PER_PAGE)
+    data = dict(extra)
+    data.update({
+        'results': [serialize_post(post, fields) for post in page],
+        'next': page_link(request, 'after', page.next_cursor),
+        'previous': page_link(request, 'before', page.previous_cursor),
+    })
+    return json_response(request, data)
+
+
+@require_safe
+def index(request):
+    """Главная лента в JSON."""
+    return feed_response(request, Post.objects.for_feed())
+
+
+@require_safe
+def group_posts(request, slug):
+    """Лента группы slug в JSON."""
+    group = get_object_or_404(Group, slug=slug)
+    counter = GroupCounter.for_group(group)
+    return feed_response(request, group.posts.for_feed(), group={
+        'slug': group.slug, 'title': group.title,
+        'description': group.description, 'posts': counter.posts,
+    })
+
+
+@require_safe
+def profile(request, username):
+    """Посты автора username в JSON."""
+    author = get_object_or_404(User, username=username)
+    counter = UserCounter.for_user(author)
+    return feed_response(request, author.posts.for_feed(), author={
+        'username': author.username, 'full_name': author.get_full_name(),
+        'posts': counter.posts, 'followers': counter.followers,
+        'following': counter.following,
+    })
+
+
+@require_safe
+def post_view(request, username, post_id):
+    """Пост post_id автора username с первой страницей комментариев."""
+    fields = parse_fields(request)
+    if fields is None:
+        return fields_error(request)
+    post = get_object_or_404(Post.objects.for_feed(),
+                             author__username=username, pk=post_id)
+    data = serialize_post(post, fields)
+    data['comments'] = comments_data(*comments.first_page(post),
+                                     username, post_id)
+    return json_response(request, data)
+
+
+@require_safe
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев поста в JSON."""
+    post = get_object_or_404(Post, author__username=username, pk=post_id)
+    comment_list, next_cursor = comments.get_page(
+        post, after=request.GET.get('after'))
+    return json_response(request, comments_data(comment_list, next_cursor,
+                                                username, post_id))
+
+
+@require_safe
+def follow_index(request):
+    """Лента подписок текущего пользователя в JSON."""
+    if not request.user.is_authenticated:
+        return error_response(request, 'Нужна авторизация.', 401)
+    return feed_response(request, TimelineFeed(request.user))
@@ -0,0 +1,45 @@
+from collections import namedtuple
+
+# Бюджет страницы: сколько SQL-запросов и миллисекунд она может
+# потратить при холодном кэше. Проверяется тестом test_budgets на
+# базе, наполненной командой seed; действия замеряются на первом
+# вызове, который меняет данные. Новая страница без бюджета тест
+# не пройдет.
+Budget = namedtuple('Budget', ('queries', 'milliseconds'))
+
+BUDGETS = {
+    # posts: ленты и страницы постов
+    'index': Budget(queries=5, milliseconds=300),
+    'new_post': Budget(queries=3, milliseconds=300),
+    'follow_index': Budget(queries=6, milliseconds=300),
+    'search': Budget(queries=4, milliseconds=300),
+    'resized_image': Budget(queries=0, milliseconds=100),
+    # posts: JSON API
+    'api_index': Budget(queries=1, milliseconds=300),
+    'api_follow_index': Budget(queries=5, milliseconds=300),
+    'api_group_posts': Budget(queries=3, milliseconds=300),
+    'api_profile': Budget(queries=3, milliseconds=300),
+    'api_post': Budget(queries=2, milliseconds=300),
+    'api_post_comments': Budget(queries=2, milliseconds=300),
+    # posts: страницы с параметрами и действия
+    'group_posts': Budget(queries=8, milliseconds=300),
+    'profile': Budget(queries=9, milliseconds=300),
+    'post': Budget(queries=8, milliseconds=300),
+    'post_edit': Budget(queries=5, milliseconds=300),
+    'add_comment': Budget(queries=9, milliseconds=300),
+    'post_comments': Budget(queries=2, milliseconds=300),
+    # Подписка раскладывает посты автора в ленту; обрезка
+    # переполненной ленты добавляет еще 4 запроса.
+    'profile_follow': Budget(queries=20, milliseconds=300),
+    'profile_unfollow': Budget(queries=12, milliseconds=300),
+    # users
+    'signup': Budget(queries=0, milliseconds=100),
+    # about
+    'about:author': Budget(queries=0, milliseconds=50),
+    'about:tech': Budget(queries=0, milliseconds=50),
+}
+
+
+def budget_for(url_name):
+    """Бюджет страницы по имени URL (с пространством имен) или None."""
+    return BUDGETS.get(url_name)
@@ -0,0 +1,67 @@
+import time
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FeedGeneration
+
+
+def _seed():
+    # Поколение новой ленты начинается со значения больше прежних: оно
+    # не совпадет с ключами, оставшимися в кэше от прежней базы.
+    return int(time.time() * 1000)
+
+
+def _create(scopes):
+    now = timezone.now()
+    FeedGeneration.objects.bulk_create(
+        (FeedGeneration(scope=scope, generation=_seed(), modified=now)
+         for scope in scopes),
+        ignore_conflicts=True
+    )
+
+
+def state(*scopes):
+    """Поколение лент scopes одной строкой для ключа кэша и время
+    их последнего изменения.
+
+    Поколения хранятся в базе, поэтому все процессы видят их
+    одинаково сразу после записи.
+    """
+    rows = FeedGeneration.objects.filter(scope__in=scopes)
+    values = {row.scope: row for row in rows}
+    missing = [scope for scope in scopes if scope not in values]
+    if missing:
+        # Когда лента менялась раньше, неизвестно: считаем, что сейчас.
+        _create(missing)
+        values.update((row.scope, row) for row in rows.filter(
+            scope__in=missing))
+    return ('.'.join(str(values[scope].generation) for scope in scopes),
+            max(values[scope].modified for scope in scopes))
+
+
+def generation(*scopes):
+    """Текущее поколение лент scopes одной строкой для ключа кэша."""
+    return state(*scopes)[0]
+
+
+def last_modified(*scopes):
+    """Время последнего изменения лент scopes."""
+    return state(*scopes)[1]
+
+
+def bump(*scopes):
+    """Сдвигает поколение лент: их закэшированные страницы устаревают."""
+    scopes = set(scopes)
+    _create(scopes)
+    FeedGeneration.objects.filter(scope__in=scopes).update(
+        generation=F('generation') + 1, modified=timezone.now())
+
+
+def post_scopes(post, *group_ids):
+    """Ленты, в которых виден пост: главная, автора и группы."""
+    scopes = ['index', f'author:{post.author_id}']
+    for group_id in {post.group_id, *group_ids}:
+        if group_id is not None:
+            scopes.append(f'group:{group_id}')
+    return scopes
@@ -0,0 +1,39 @@
+from django.core.cache import cache
+
+from .paginator import CursorPaginator
+
+COMMENTS_PER_PAGE = 20
+COMMENTS_TIMEOUT = 60 * 60 * 24
+# Комментарии идут от старых к новым; id различает равные created.
+ORDERING = ('created', 'id')
+
+
+def first_page_key(post):
+    return f'post_comments:{post.id}:{post.version}'
+
+
+def get_page(post, after=None):
+    """Страница комментариев поста после курсора after: список
+    комментариев с авторами (одним запросом) и курсор следующей
+    страницы или None.
+    """
+    comment_list = (post.comments.select_related('author')
+                    .order_by(*ORDERING))
+    paginator = CursorPaginator(comment_list, COMMENTS_PER_PAGE,
+                                ordering=ORDERING)
+    page = paginator.get_page(after=after)
+    return list(page), page.next_cursor
+
+
+def first_page(post):
+    """Первая страница комментариев поста из кэша.
+
+    Ключ содержит версию поста, а новый или удаленный комментарий
+    ее сдвигает, поэтому закэшированная страница не устаревает.
+    """
+    key = first_page_key(post)
+    page = cache.get(key)
+    if page is None:
+        page = get_page(post)
+        cache.set(key, page, COMMENTS_TIMEOUT)
+    return page
@@ -0,0 +1,67 @@
+from functools import wraps
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.crypto import salted_hmac
+from django.views.decorators.http import condition
+
+from . import caching
+
+
+def viewer(request):
+    """Часть валидатора, которая разделяет варианты страницы.
+
+    Для пользователя в нее входит и сессия: после нового входа
+    в странице другой CSRF-токен, и старая копия не подходит.
+    """
+    if not request.user.is_authenticated:
+        return 'anon'
+    session = salted_hmac('posts.conditional',
+                          request.session.session_key or '').hexdigest()
+    return f'{request.user.pk}-{session[:12]}'
+
+
+def feed_condition(get_scopes):
+    """Декоратор условного GET для страниц, которые зависят только
+    от лент get_scopes(**kwargs) и от читателя.
+
+    ETag - поколение лент (см. caching.state) и читатель,
+    Last-Modified - время последнего изменения лент. Оба берутся
+    из базы одним запросом без рендера страницы; если они совпадают
+    с заголовками If-None-Match/If-Modified-Since, отдается 304.
+    Поколение остается в request.feed_generation для ключей кэша
+    фрагментов страницы.
+    """
+    def state(request, kwargs):
+        # condition вызывает обе функции: ленты ищутся один раз.
+        if not hasattr(request, 'feed_generation'):
+            feed_scopes = get_scopes(**kwargs)
+            request.feed_generation, request._feed_modified = (
+                caching.state(*feed_scopes) if feed_scopes
+                else (None, None))
+        return request.feed_generation, request._feed_modified
+
+    def etag(request, *args, **kwargs):
+        generation = state(request, kwargs)[0]
+        if generation is None:
+            return None
+        return f'{generation}-{viewer(request)}'
+
+    def last_modified(request, *args, **kwargs):
+        return state(request, kwargs)[1]
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag,
+                                     last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            # Браузер хранит копию, но каждый раз сверяет ее с сервером;
+            # страницы пользователя не кэшируются общими прокси.
+            patch_cache_control(response, no_cache=True)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,88 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import (Comment, Follow, Group, GroupCounter, MediaFile, Post,
+                     TimelineEntry, UserCounter)
+
+User = get_user_model()
+
+
+def change(model, pk, **deltas):
+    """Атомарно сдвигает счетчики строки pk на значения deltas.
+
+    Недостающая строка создается только при увеличении: уменьшение
+    приходит и при каскадном удалении владельца счетчика.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if pk is None or not deltas:
+        return
+    updates = {name: F(name) + delta for name, delta in deltas.items()}
+    # Счетчик не уходит ниже нуля, даже если он разошелся с данными.
+    floor = {f'{name}__gte': -delta
+             for name, delta in deltas.items() if delta < 0}
+    if model.objects.filter(pk=pk, **floor).update(**updates):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        with transaction.atomic():
+            _, created = model.objects.get_or_create(pk=pk,
+                                                     defaults=deltas)
+            if not created:
+                model.objects.filter(pk=pk).update(**updates)
+
+
+def count_by(queryset, field):
+    """Число строк queryset по значениям field: {значение: число}."""
+    return dict(queryset.order_by().values_list(field)
+                .annotate(count=Count('pk')).iterator())
+
+
+def bulk_create(model, objects, batch_size):
+    """bulk_create пачками: объекты не собираются в один список."""
+    iterator = iter(objects)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def rebuild(batch_size=10000):
+    """Пересчитывает все счетчики с нуля по таблицам постов,
+    подписок и комментариев, а также ссылки постов на файлы картинок.
+
+    Каждая связь считается отдельным GROUP BY: один запрос с JOIN
+    всех таблиц перемножает строки и на большой базе не завершится.
+    """
+    users = {
+        'posts': count_by(Post.objects, 'author'),
+        'followers': count_by(Follow.objects, 'author'),
+        'following': count_by(Follow.objects, 'user'),
+        'comments': count_by(Comment.objects, 'author'),
+        'inbox': count_by(TimelineEntry.objects, 'user'),
+    }
+    group_posts = count_by(Post.objects.exclude(group=None), 'group')
+    images = count_by(Post.objects.exclude(image='').exclude(image=None),
+                      'image')
+    # Признак pulled - состояние лент, а не счетчик: он сохраняется.
+    pulled = set(UserCounter.objects.filter(pulled=True)
+                 .values_list('pk', flat=True))
+    with transaction.atomic():
+        UserCounter.objects.all().delete()
+        GroupCounter.objects.all().delete()
+        MediaFile.objects.all().delete()
+        bulk_create(UserCounter, (
+            UserCounter(user_id=pk, pulled=pk in pulled,
+                        **{name: counts.get(pk, 0)
+                           for name, counts in users.items()})
+            for pk in User.objects.values_list('pk', flat=True).iterator()
+        ), batch_size)
+        bulk_create(GroupCounter, (
+            GroupCounter(group_id=pk, posts=group_posts.get(pk, 0))
+            for pk in Group.objects.values_list('pk', flat=True).iterator()
+        ), batch_size)
+        bulk_create(MediaFile, (
+            MediaFile(name=name, refs=refs) for name, refs in images.items()
+        ), batch_size)
@@ -0,0 +1,281 @@
+import heapq
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .gc import batches
+from .models import Follow, Post, TimelineEntry, UserCounter
+from .paginator import seek
+
+
+def inbox_limit():
+    return getattr(settings, 'FEED_INBOX_LIMIT', 1000)
+
+
+def pull_threshold():
+    return getattr(settings, 'FEED_PULL_THRESHOLD', None)
+
+
+def push_threshold():
+    """Число подписчиков, ниже которого посты бывшего популярного автора
+    снова раскладываются по лентам. Оно ниже FEED_PULL_THRESHOLD, чтобы
+    автор на границе порога не переключался туда и обратно.
+    """
+    threshold = pull_threshold()
+    return getattr(settings, 'FEED_PUSH_THRESHOLD',
+                   None if threshold is None else threshold * 9 // 10)
+
+
+def pulled_counters(prefix=''):
+    """Условие на UserCounter (через prefix - на связанную модель):
+    посты автора читаются при показе ленты.
+    """
+    condition = Q(**{f'{prefix}pulled': True})
+    threshold = pull_threshold()
+    if threshold is not None:
+        condition |= Q(**{f'{prefix}followers__gte': threshold})
+    return condition
+
+
+def is_pulled(author_id):
+    """Посты авторов с числом подписчиков от FEED_PULL_THRESHOLD
+    не раскладываются по лентам, а читаются при показе ленты.
+    Так же читаются посты автора, который перестал быть популярным,
+    пока push_pending не разложит их по лентам.
+    """
+    if pull_threshold() is None:
+        return False
+    return UserCounter.objects.filter(
+        pulled_counters(), pk=author_id).exists()
+
+
+def deliver(user_ids, posts):
+    """Раскладывает посты posts в ленты пользователей user_ids.
+
+    Ленты, превысившие FEED_INBOX_LIMIT с запасом в 10%, обрезаются;
+    запас нужен, чтобы не обрезать ленту при каждой новой записи.
+    """
+    user_ids, posts = list(user_ids), list(posts)
+    if not user_ids or not posts:
+        return
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post.id,
+                       author_id=post.author_id, pub_date=post.pub_date)
+         for user_id in user_ids for post in posts),
+        ignore_conflicts=True
+    )
+    UserCounter.objects.filter(pk__in=user_ids).update(
+        inbox=F('inbox') + len(posts))
+    overflow = inbox_limit() + inbox_limit() // 10
+    for user_id in (UserCounter.objects
+                    .filter(pk__in=user_ids, inbox__gt=overflow)
+                    .values_list('pk', flat=True)):
+        trim(user_id)
+
+
+def trim(user_id):
+    """Оставляет в ленте пользователя не больше FEED_INBOX_LIMIT записей."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    cutoff = (entries.order_by('-pub_date', '-post_id')
+              .values_list('pub_date', flat=True)[inbox_limit():][:1])
+    cutoff = list(cutoff)
+    if cutoff:
+        entries.filter(pub_date__lte=cutoff[0]).delete()
+    UserCounter.objects.filter(pk=user_id).update(inbox=entries.count())
+
+
+def fan_out(post):
+    """Доставляет новый пост в ленты всех подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    follower_ids = (Follow.objects.filter(author_id=post.author_id)
+                    .values_list('user_id', flat=True))
+    deliver(follower_ids, [post])
+
+
+def move(post):
+    """Перекладывает пост, у которого сменился автор, из лент
+    подписчиков прежнего автора в ленты подписчиков нового.
+    """
+    entries = TimelineEntry.objects.filter(post_id=post.id)
+    user_ids = list(entries.values_list('user_id', flat=True))
+    entries.delete()
+    UserCounter.objects.filter(pk__in=user_ids, inbox__gte=1).update(
+        inbox=F('inbox') - 1)
+    fan_out(post)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту нового подписчика последние посты автора."""
+    if is_pulled(author_id):
+        return
+    posts = (Post.objects.filter(author_id=author_id)
+             .order_by('-pub_date', '-id')
+             .only('id', 'author_id', 'pub_date')[:inbox_limit()])
+    deliver([user_id], posts)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора, от которого
+    он отписался.
+    """
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+    if deleted:
+        UserCounter.objects.filter(pk=user_id, inbox__gte=deleted).update(
+            inbox=F('inbox') - deleted)
+    threshold = pull_threshold()
+    if threshold is not None:
+        # Автор только что перестал быть популярным: его посты
+        # по-прежнему читаются при показе ленты, а по лентам их
+        # разложит push_pending вне запроса.
+        UserCounter.objects.filter(
+            pk=author_id, followers=threshold - 1).update(pulled=True)
+
+
+def push(user_ids, posts):
+    """Раскладывает посты posts в ленты user_ids с пересчетом inbox:
+    часть постов могла уже лежать в лентах.
+    """
+    if not user_ids or not posts:
+        return
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post.id,
+                       author_id=post.author_id, pub_date=post.pub_date)
+         for user_id in user_ids for post in posts),
+        ignore_conflicts=True
+    )
+    UserCounter.objects.filter(pk__in=user_ids).update(inbox=Coalesce(
+        Subquery(TimelineEntry.objects.filter(user_id=OuterRef('pk'))
+                 .order_by().values('user_id')
+                 .annotate(count=Count('pk')).values('count')), 0))
+    for user_id in (UserCounter.objects
+                    .filter(pk__in=user_ids, inbox__gt=inbox_limit())
+                    .values_list('pk', flat=True)):
+        trim(user_id)
+
+
+def push_again(author_id, batch_size=1000):
+    """Раскладывает последние посты автора по лентам его подписчиков
+    пачками по batch_size подписчиков и снимает с него признак pulled.
+
+    Пока признак стоит, новые посты и подписки автора не раскладываются;
+    появившиеся за время раскладки докладываются после снятия признака.
+    """
+    recent = (Post.objects.filter(author_id=author_id)
+              .order_by('-pub_date', '-id')
+              .only('id', 'author_id', 'pub_date'))
+    follows = Follow.objects.filter(author_id=author_id).order_by('id')
+    last_post = recent.aggregate(last=Max('id'))['last'] or 0
+    last_follow = follows.aggregate(last=Max('id'))['last'] or 0
+
+    def push_to(follows, posts):
+        if not posts:
+            return
+        user_ids = follows.values_list('user_id', flat=True).iterator()
+        for batch in batches(user_ids, batch_size):
+            push(batch, posts)
+
+    push_to(follows.filter(id__lte=last_follow), list(recent[:inbox_limit()]))
+    UserCounter.objects.filter(pk=author_id).update(pulled=False)
+    push_to(follows.filter(id__lte=last_follow),
+            list(recent.filter(id__gt=last_post)[:inbox_limit()]))
+    push_to(follows.filter(id__gt=last_follow), list(recent[:inbox_limit()]))
+
+
+def push_pending(batch_size=1000):
+    """Раскладывает по лентам посты авторов, переставших быть
+    популярными, когда подписчиков стало меньше FEED_PUSH_THRESHOLD.
+    Возвращает число таких авторов.
+    """
+    pending = UserCounter.objects.filter(pulled=True)
+    threshold = push_threshold()
+    if threshold is not None:
+        pending = pending.filter(followers__lt=threshold)
+    author_ids = list(pending.values_list('pk', flat=True))
+    for author_id in author_ids:
+        push_again(author_id, batch_size)
+    return len(author_ids)
+
+
+def rebuild():
+    """Раскладывает все ленты подписок заново одним INSERT ... SELECT:
+    в ленту каждого пользователя попадают последние FEED_INBOX_LIMIT
+    постов его авторов, кроме популярных (см. is_pulled).
+
+    Нужен после массовой загрузки данных мимо сигналов (bulk_create);
+    счетчики inbox после него пересчитывает counters.rebuild().
+    """
+    timeline = TimelineEntry._meta.db_table
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    params = [inbox_limit()]
+    pulled = ''
+    if pull_threshold() is not None:
+        # Подписчики считаются по таблице подписок: счетчики после
+        # массовой загрузки еще не пересчитаны.
+        pulled = (f'WHERE f.author_id NOT IN (SELECT author_id FROM {follow} '
+                  f'GROUP BY author_id HAVING COUNT(*) >= %s)')
+        params.append(pull_threshold())
+    params.append(inbox_limit())
+    # В ленту не попадет больше inbox_limit постов одного автора, поэтому
+    # с подписками соединяются только последние посты каждого автора.
+    recent = (f'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+              f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC) '
+              f'AS position FROM {post}')
+    with transaction.atomic(), connection.cursor() as cursor:
+        TimelineEntry.objects.all().delete()
+        cursor.execute(
+            f'INSERT INTO {timeline} (user_id, post_id, author_id, pub_date) '
+            f'SELECT user_id, post_id, author_id, pub_date FROM ('
+            f'SELECT f.user_id, p.id AS post_id, p.author_id, p.pub_date, '
+            f'ROW_NUMBER() OVER (PARTITION BY f.user_id '
+            f'ORDER BY p.pub_date DESC, p.id DESC) AS position '
+            f'FROM {follow} f JOIN ({recent}) AS p '
+            f'ON p.author_id = f.author_id AND p.position <= %s '
+            f'{pulled}) AS entries WHERE position <= %s', params)
+        # Посты всех авторов ниже порога только что разложены.
+        UserCounter.objects.filter(pulled=True).update(pulled=False)
+
+
+class TimelineFeed:
+    """Источник для CursorPaginator: лента подписок пользователя.
+
+    Ключ страницы - (pub_date, id) поста, как и у остальных лент.
+    Разложенные при публикации посты выбираются по индексу ленты,
+    посты популярных авторов (см. is_pulled) - отдельным запросом
+    на каждого автора, и все списки сливаются k-way merge.
+    """
+    model = Post
+    ordering = ('-pub_date', '-post_id')
+
+    def __init__(self, user):
+        self.entries = TimelineEntry.objects.filter(user=user)
+        self.pulled_authors = []
+        if pull_threshold() is not None:
+            self.pulled_authors = list(
+                Follow.objects.filter(pulled_counters('author__counter__'),
+                                      user=user)
+                .values_list('author_id', flat=True))
+
+    def seek(self, key=None, backwards=False, offset=0, limit=None):
+        size = None if limit is None else offset + limit
+        sources = [seek(self.entries.values_list('pub_date', 'post_id'),
+                        self.ordering, key, backwards, 0, size)]
+        for author_id in self.pulled_authors:
+            sources.append(seek(
+                Post.objects.filter(author_id=author_id)
+                .values_list('pub_date', 'id'),
+                ('-pub_date', '-id'), key, backwards, 0, size))
+        post_ids = []
+        for _, post_id in heapq.merge(*sources, reverse=not backwards):
+            # Пост мог попасть в ленты до того, как автор стал популярным.
+            if post_id not in post_ids:
+                post_ids.append(post_id)
+            if len(post_ids) == size:
+                break
+        post_ids = post_ids[offset:]
+        posts = Post.objects.for_feed().in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -1,5 +1,7 @@
+from django.core.exceptions import ValidationError
 from django.forms import ModelForm
 
+from . import uploads
 from .models import Comment, Post
 
 
@@ -8,6 +10,24 @@ class PostForm(ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean(self):
+        """Проверяет новую картинку по размеру файла и заголовку
+        (POST_IMAGE_MAX_BYTES, POST_IMAGE_MAX_PIXELS) до того, как
+        ее пиксели будут распакованы.
+
+        Ошибка лимита заменяет ошибку поля: обрезанный или слишком
+        большой файл ImageField считает просто неправильным.
+        """
+        cleaned_data = super().clean()
+        upload = self.files.get(self.add_prefix('image'))
+        if upload:
+            try:
+                uploads.check_image(upload)
+            except ValidationError as error:
+                self.errors.pop('image', None)
+                self.add_error('image', error)
+        return cleaned_data
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,180 @@
+import logging
+import os
+import time
+from itertools import islice
+
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from . import resize
+from .models import MediaFile, Post
+
+logger = logging.getLogger(__name__)
+
+
+def walk(storage, directory, min_age):
+    """Файлы каталога directory хранилища, измененные раньше чем
+    min_age секунд назад: пары (имя в хранилище, размер).
+
+    Свежие файлы пропускаются: пост с только что загруженной
+    картинкой мог еще не попасть в базу.
+    """
+    root = storage.path(directory)
+    deadline = time.time() - min_age
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > deadline:
+                continue
+            name = os.path.relpath(path, storage.location)
+            yield name.replace(os.sep, '/'), stat.st_size
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def source_thumbnails(names, storage):
+    """Миниатюры картинок names по спискам KVStore sorl-thumbnail:
+    {имя картинки: [(имя миниатюры, ключ ее записи в KVStore)]}.
+    """
+    kvstore = default.kvstore
+    found = {}
+    for name in names:
+        source = ImageFile(name, storage)
+        keys = kvstore._get(source.key, identity='thumbnails') or []
+        found[name] = [
+            (thumbnail.name, add_prefix(key))
+            for key, thumbnail in ((key, kvstore._get(key)) for key in keys)
+            if thumbnail is not None
+        ]
+    return found
+
+
+def file_sizes(storage, names):
+    """Размеры файлов names; пропавшие файлы пропускаются."""
+    found = {}
+    for name in names:
+        try:
+            found[name] = storage.size(name)
+        except FileNotFoundError:
+            continue
+    return found
+
+
+class Collector:
+    """Сборщик картинок, на которые не ссылается ни один Post.image,
+    и их миниатюр sorl-thumbnail.
+
+    Обходит MEDIA_ROOT/posts/ и кэш миниатюр, удаляет файлы
+    пачками по batch_size с паузой pause секунд между пачками, чтобы
+    не загружать диск и базу. В режиме dry_run только считает.
+
+    Миниатюры удаленной картинки находятся по ее списку в KVStore.
+    Файл в кэше миниатюр, которого нет в KVStore, не найдет ни один
+    шаблон (sorl создаст миниатюру заново), поэтому он тоже удаляется;
+    так в памяти держится только текущая пачка имен.
+    """
+
+    def __init__(self, batch_size=100, pause=0.5, min_age=3600,
+                 dry_run=False):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.min_age = min_age
+        self.dry_run = dry_run
+        self.storage = Post._meta.get_field('image').storage
+        self.report = {
+            'originals': {'files': 0, 'bytes': 0},
+            'thumbnails': {'files': 0, 'bytes': 0},
+        }
+
+    def run(self):
+        self.sweep_originals()
+        self.sweep_thumbnails()
+        return self.report
+
+    def throttle(self):
+        if self.pause:
+            time.sleep(self.pause)
+
+    def sweep_originals(self):
+        upload_to = Post._meta.get_field('image').upload_to
+        files = walk(self.storage, upload_to, self.min_age)
+        for batch in batches(files, self.batch_size):
+            sizes = dict(batch)
+            live = set(Post.objects.filter(image__in=list(sizes))
+                       .values_list('image', flat=True))
+            orphans = [name for name in sizes if name not in live]
+            if orphans:
+                found = source_thumbnails(orphans, self.storage)
+                self.collect('originals', orphans, sizes)
+                thumbnail_sizes = file_sizes(
+                    default.storage,
+                    [name for items in found.values() for name, _ in items])
+                self.collect('thumbnails', list(thumbnail_sizes),
+                             thumbnail_sizes)
+                if not self.dry_run:
+                    self.delete_originals(orphans, found)
+                self.throttle()
+
+    def sweep_thumbnails(self):
+        files = walk(default.storage, thumbnail_settings.THUMBNAIL_PREFIX,
+                     self.min_age)
+        for batch in batches(files, self.batch_size):
+            sizes = dict(batch)
+            known = default.kvstore.get_many(
+                ImageFile(name, default.storage) for name in sizes)
+            orphans = [name for name in sizes
+                       if ImageFile(name, default.storage).key not in known]
+            if orphans:
+                self.collect('thumbnails', orphans, sizes)
+                if not self.dry_run:
+                    self.delete_thumbnails(orphans)
+                self.throttle()
+
+    def collect(self, kind, names, sizes):
+        size = sum(sizes[name] for name in names)
+        self.report[kind]['files'] += len(names)
+        self.report[kind]['bytes'] += size
+        logger.info('Без ссылок (%s): %d файлов, %d байт%s', kind,
+                    len(names), size, ' (dry run)' if self.dry_run else '')
+
+    def delete_originals(self, names, thumbnails):
+        """Удаляет картинки names и их миниатюры thumbnails
+        (см. source_thumbnails).
+        """
+        # Пока шла проверка, файл мог снова понадобиться новому посту.
+        live = set(Post.objects.filter(image__in=names)
+                   .values_list('image', flat=True))
+        names = [name for name in names if name not in live]
+        # Таблица постов важнее счетчика ссылок, даже если он разошелся.
+        MediaFile.objects.filter(name__in=names).delete()
+        keys = []
+        for name in names:
+            source = ImageFile(name, self.storage)
+            keys += [add_prefix(source.key),
+                     add_prefix(source.key, 'thumbnails')]
+            for thumbnail, key in thumbnails.get(name, []):
+                keys.append(key)
+                default.storage.delete(thumbnail)
+            self.storage.delete(name)
+            resize.purge(name)
+        default.kvstore._delete_raw(*keys)
+
+    def delete_thumbnails(self, names):
+        keys = []
+        for name in names:
+            keys.append(add_prefix(ImageFile(name, default.storage).key))
+            default.storage.delete(name)
+        default.kvstore._delete_raw(*keys)
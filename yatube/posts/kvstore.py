@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+def lru_size():
+    return getattr(settings, 'THUMBNAIL_KVSTORE_LRU_SIZE', 10000)
+
+
+class LRUKVStore(KVStore):
+    """KVStore sorl-thumbnail с ограниченным LRU в памяти процесса
+    перед общим кэшем и таблицей thumbnail_kvstore.
+
+    В LRU попадают только найденные значения: миниатюра, которую
+    в это время создает другой процесс, не застрянет в нем
+    отсутствующей. Записи и удаления этого процесса обновляют LRU.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._lru)}
+
+    def reset(self):
+        """Очищает LRU и счетчики, общий кэш и таблицу не трогает."""
+        with self._lock:
+            self._lru.clear()
+            self.hits = self.misses = 0
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > lru_size():
+                self._lru.popitem(last=False)
+
+    def _lookup(self, key):
+        with self._lock:
+            value = self._lru.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._lru.move_to_end(key)
+            return value
+
+    def _get_raw(self, key):
+        value = self._lookup(key)
+        if value is None:
+            value = super()._get_raw(key)
+            if value is not None:
+                self._remember(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        with self._lock:
+            for key in keys:
+                self._lru.pop(key, None)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.reset()
+
+    def get_many(self, image_files):
+        """Ищет все image_files разом: сначала в LRU, затем одним
+        get_many в общем кэше и одним запросом к таблице.
+
+        Возвращает словарь {ключ image_file: найденный ImageFile},
+        найденные значения остаются в LRU для последующих get().
+        """
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = {}
+        for key in keys:
+            value = self._lookup(key)
+            if value is not None:
+                values[key] = value
+        missing = [key for key in keys if key not in values]
+        if missing:
+            cached = self.cache.get_many(missing)
+            stored = {}
+            unknown = [key for key in missing if key not in cached]
+            if unknown:
+                stored = dict(KVStoreModel.objects
+                              .filter(key__in=unknown)
+                              .values_list('key', 'value'))
+                # Как и в KVStore: отсутствие тоже кэшируется, чтобы
+                # не ходить в базу за той же миниатюрой снова.
+                self.cache.set_many(
+                    {key: stored.get(key, EMPTY_VALUE) for key in unknown},
+                    thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+            for key in missing:
+                value = cached.get(key, stored.get(key))
+                if value is not None and value != EMPTY_VALUE:
+                    values[key] = value
+                    self._remember(key, value)
+        return {keys[key]: deserialize_image_file(value)
+                for key, value in values.items()}
@@ -0,0 +1,55 @@
+from django.core.files.images import get_image_dimensions
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails, uploads
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Создает недостающие варианты картинок постов (ширины '
+            'VARIANT_WIDTHS, WebP и формат оригинала) и заглушки '
+            'для уже загруженных файлов posts/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать недостающие варианты')
+
+    def handle(self, *args, **options):
+        backend = thumbnails.BackgroundThumbnailBackend()
+        posts = (Post.objects.filter(image__startswith='posts/')
+                 .only('image', 'image_width', 'image_height',
+                       'image_placeholder')
+                 .order_by('id'))
+        seen, created = set(), 0
+        for post in posts.iterator():
+            if post.image.name in seen:
+                continue
+            seen.add(post.image.name)
+            if post.image_width is None and not options['dry_run']:
+                # Размеры картинок, загруженных до их учета.
+                post.image_width, post.image_height = (
+                    get_image_dimensions(post.image))
+                Post.objects.filter(image=post.image.name).update(
+                    image_width=post.image_width,
+                    image_height=post.image_height)
+            if not post.image_placeholder and not options['dry_run']:
+                Post.objects.filter(image=post.image.name).update(
+                    image_placeholder=uploads.placeholder(post.image))
+            source = ImageFile(post.image)
+            missing = []
+            for geometry, variant in thumbnails.variants(post):
+                thumbnail = ImageFile(
+                    backend.thumbnail_name(source, geometry, dict(variant)),
+                    default.storage)
+                if not default.kvstore.get(thumbnail):
+                    missing.append(
+                        (geometry, tuple(sorted(variant.items()))))
+            created += len(missing)
+            if missing and not options['dry_run']:
+                thumbnails.generate((post.image.name, tuple(missing)),
+                                    post.image.storage)
+        verb = 'Нужно создать' if options['dry_run'] else 'Создано'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} вариантов: {created} для картинок: {len(seen)}'))
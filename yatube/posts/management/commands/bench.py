@@ -0,0 +1,207 @@
+import json
+import math
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import comments, resize
+from posts.budgets import budget_for
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def percentile(values, quantile):
+    """Процентиль по ближайшему рангу."""
+    values = sorted(values)
+    rank = max(math.ceil(quantile * len(values)), 1)
+    return values[rank - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), capture_output=True,
+            text=True, check=True, cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def host():
+    """Имя хоста из ALLOWED_HOSTS, которое примет сайт."""
+    for name in settings.ALLOWED_HOSTS:
+        if name != '*':
+            return name.lstrip('.')
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа страниц на текущей базе (p50/p95/p99) '
+            'и пишет результаты в JSON, чтобы сравнивать их между '
+            'коммитами. Страницы, которые меняют данные, не замеряются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=50,
+                            help='Число замеров каждой страницы')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Число запросов до замеров')
+        parser.add_argument('--cold', action='store_true',
+                            help='Сбрасывать кэш перед каждым запросом')
+        parser.add_argument('--views', nargs='+', metavar='URL_NAME',
+                            help='Замерить только эти страницы')
+        parser.add_argument('--output', default='bench.json',
+                            help='Файл для результатов')
+        parser.add_argument('--compare', metavar='FILE',
+                            help='Сравнить с результатами из FILE')
+
+    def handle(self, *args, **options):
+        requests = self.requests()
+        if options['views']:
+            unknown = set(options['views']) - set(requests)
+            if unknown:
+                raise CommandError(
+                    f'Нет таких страниц: {", ".join(sorted(unknown))}')
+            requests = {name: requests[name] for name in options['views']}
+        results = {}
+        for name, (client, url) in requests.items():
+            results[name] = self.measure(client, url, options)
+            self.report(name, results[name])
+        data = {
+            'commit': git_commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'runs': options['runs'],
+            'cold': options['cold'],
+            'views': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(data, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def requests(self):
+        """Адреса страниц на данных текущей базы: имя URL -> (клиент,
+        адрес). Берутся самые нагруженные автор, группа, пост и читатель.
+        """
+        reader = (Follow.objects.values('user')
+                  .annotate(count=Count('pk')).order_by('-count').first())
+        author = (Post.objects.values('author')
+                  .annotate(count=Count('pk')).order_by('-count').first())
+        post = (Comment.objects.values('post')
+                .annotate(count=Count('pk')).order_by('-count').first())
+        group = (Post.objects.exclude(group=None).values('group')
+                 .annotate(count=Count('pk')).order_by('-count').first())
+        if not (reader and author and group):
+            raise CommandError('База пуста: сначала запустите seed')
+        reader = User.objects.get(pk=reader['user'])
+        author = User.objects.get(pk=author['author'])
+        group = Group.objects.get(pk=group['group'])
+        post = (Post.objects.get(pk=post['post']) if post
+                else author.posts.first())
+        post_kwargs = {'username': post.author.username, 'post_id': post.id}
+        cursor = comments.get_page(post)[1]
+        guest = Client(HTTP_HOST=host())
+        user = Client(HTTP_HOST=host())
+        user.force_login(reader)
+        owner = Client(HTTP_HOST=host())
+        owner.force_login(post.author)
+        requests = {
+            'index': (guest, reverse('index')),
+            'new_post': (user, reverse('new_post')),
+            'follow_index': (user, reverse('follow_index')),
+            'search': (guest, reverse('search') + '?q=город'),
+            'api_index': (guest, reverse('api_index')),
+            'api_follow_index': (user, reverse('api_follow_index')),
+            'api_group_posts': (guest, reverse(
+                'api_group_posts', kwargs={'slug': group.slug})),
+            'api_profile': (guest, reverse(
+                'api_profile', kwargs={'username': author.username})),
+            'api_post': (guest, reverse('api_post', kwargs=post_kwargs)),
+            'group_posts': (guest, reverse(
+                'group_posts', kwargs={'slug': group.slug})),
+            'profile': (guest, reverse(
+                'profile', kwargs={'username': author.username})),
+            'post': (guest, reverse('post', kwargs=post_kwargs)),
+            'post_edit': (owner, reverse('post_edit', kwargs=post_kwargs)),
+            'signup': (guest, reverse('signup')),
+            'about:author': (guest, reverse('about:author')),
+            'about:tech': (guest, reverse('about:tech')),
+        }
+        if cursor:
+            requests['post_comments'] = (guest, reverse(
+                'post_comments', kwargs=post_kwargs) + f'?after={cursor}')
+            requests['api_post_comments'] = (guest, reverse(
+                'api_post_comments', kwargs=post_kwargs) + f'?after={cursor}')
+        image = Post.objects.exclude(image='').exclude(image=None).first()
+        if image:
+            requests['resized_image'] = (
+                guest, resize.url(image.image.name, 320, 113))
+        return requests
+
+    def measure(self, client, url, options):
+        for _ in range(options['warmup']):
+            client.get(url)
+        timings = []
+        for _ in range(options['runs']):
+            if options['cold']:
+                cache.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(1000 * (time.perf_counter() - started))
+        if options['cold']:
+            cache.clear()
+        # Запросы считаются отдельно: их запись замедляет страницу.
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        return {
+            'url': url,
+            'status': response.status_code,
+            'queries': len(queries),
+            'p50': round(percentile(timings, 0.5), 3),
+            'p95': round(percentile(timings, 0.95), 3),
+            'p99': round(percentile(timings, 0.99), 3),
+            'mean': round(statistics.mean(timings), 3),
+        }
+
+    def report(self, name, result):
+        line = (f'{name:>18}: p50 {result["p50"]:8.2f} ms, '
+                f'p95 {result["p95"]:8.2f} ms, p99 {result["p99"]:8.2f} ms, '
+                f'запросов {result["queries"]}')
+        budget = budget_for(name)
+        if budget and result['p95'] > budget.milliseconds:
+            line += f' (бюджет {budget.milliseconds} ms превышен)'
+        self.stdout.write(line)
+
+    def compare(self, path, results):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.stdout.write(f'Сравнение с {path} '
+                          f'(коммит {baseline.get("commit")}):')
+        for name, result in results.items():
+            before = baseline['views'].get(name)
+            if not before:
+                continue
+            change = 100 * (result['p95'] - before['p95']) / before['p95']
+            self.stdout.write(
+                f'{name:>18}: p95 {before["p95"]:8.2f} -> '
+                f'{result["p95"]:8.2f} ms ({change:+.1f}%), запросов '
+                f'{before["queries"]} -> {result["queries"]}')
@@ -0,0 +1,108 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import counters
+from posts.feed import TimelineFeed
+from posts.models import Follow, Post, TimelineEntry
+from posts.paginator import CursorPaginator
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает ленты подписок pull, push и hybrid на '
+            'сгенерированном графе подписок. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--posts', type=int, default=300,
+                            help='Число публикуемых постов')
+        parser.add_argument('--reads', type=int, default=200,
+                            help='Число чтений ленты')
+        parser.add_argument('--threshold', type=int, default=100,
+                            help='FEED_PULL_THRESHOLD для hybrid')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            users = self.make_graph(options['users'], options['follows'])
+            strategies = (
+                ('pull', 0),
+                ('push', None),
+                ('hybrid', options['threshold']),
+            )
+            for name, threshold in strategies:
+                with transaction.atomic():
+                    result = self.run(users, threshold, options)
+                    transaction.set_rollback(True)
+                self.report(name, result)
+            transaction.set_rollback(True)
+
+    def make_graph(self, count, follows):
+        """Пользователи и подписки со степенным распределением
+        популярности авторов.
+        """
+        prefix = f'bench_{time.time_ns()}'
+        User.objects.bulk_create(
+            User(username=f'{prefix}_{i}') for i in range(count))
+        users = list(User.objects.filter(username__startswith=prefix)
+                     .values_list('id', flat=True))
+        weights = [1 / (rank + 1) for rank in range(count)]
+        pairs = set()
+        for user_id in users:
+            for author_id in self.random.choices(users, weights, k=follows):
+                if author_id != user_id:
+                    pairs.add((user_id, author_id))
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs)
+        )
+        counters.rebuild()
+        return users
+
+    def run(self, users, threshold, options):
+        with override_settings(FEED_PULL_THRESHOLD=threshold):
+            TimelineEntry.objects.all().delete()
+            writes = []
+            for author_id in self.random.choices(users, k=options['posts']):
+                started = time.perf_counter()
+                Post.objects.create(text='bench', author_id=author_id)
+                writes.append(time.perf_counter() - started)
+            reads = []
+            for user_id in self.random.choices(users, k=options['reads']):
+                user = User(pk=user_id)
+                started = time.perf_counter()
+                if threshold == 0:
+                    feed = Post.objects.for_feed().filter(
+                        author__following__user=user)
+                else:
+                    feed = TimelineFeed(user)
+                list(CursorPaginator(feed, 10).get_page())
+                reads.append(time.perf_counter() - started)
+            return {
+                'writes': writes,
+                'reads': reads,
+                'rows': TimelineEntry.objects.count(),
+            }
+
+    def report(self, name, result):
+        def ms(values, quantile):
+            values = sorted(values)
+            return 1000 * values[int(quantile * (len(values) - 1))]
+
+        write = 1000 * statistics.mean(result['writes'])
+        self.stdout.write(
+            f'{name:>6}: write mean {write:.2f} ms, '
+            f'read p50 {ms(result["reads"], 0.5):.2f} ms, '
+            f'read p95 {ms(result["reads"], 0.95):.2f} ms, '
+            f'timeline rows {result["rows"]}'
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.gc import Collector
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, на которые не ссылается ни один пост, '
+            'и их миниатюры. Рассчитана на запуск по расписанию: '
+            'удаляет пачками с паузами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, что будет удалено')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--pause', type=float, default=0.5,
+                            help='Пауза между пачками, секунд')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Не трогать файлы моложе, секунд')
+
+    def handle(self, *args, **options):
+        report = Collector(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            min_age=options['min_age'],
+            dry_run=options['dry_run'],
+        ).run()
+        titles = {'originals': 'Картинки', 'thumbnails': 'Миниатюры'}
+        for kind, title in titles.items():
+            self.stdout.write(f'{title}: {report[kind]["files"]} файлов, '
+                              f'{report[kind]["bytes"]} байт')
+        total = sum(item['bytes'] for item in report.values())
+        verb = 'Можно освободить' if options['dry_run'] else 'Освобождено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} байт: {total}'))
@@ -0,0 +1,45 @@
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from django.core.management.base import BaseCommand
+
+from posts import media, uploads
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Нормализует уже загруженные картинки постов: уменьшает, '
+            'убирает метаданные и перекодирует (см. POST_IMAGE_MAX_SIDE '
+            'и POST_IMAGE_QUALITY)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, сколько байтов '
+                                 'сэкономит нормализация')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = (Post.objects.filter(image__startswith='posts/')
+                 .order_by('image').values_list('image', flat=True)
+                 .distinct())
+        normalized = saved = 0
+        for name in list(names):
+            if not storage.exists(name):
+                continue
+            with storage.open(name) as file:
+                before = file.size
+                data = uploads.normalize(file)
+            if data is None:
+                continue
+            normalized += 1
+            saved += before - len(data)
+            if options['dry_run']:
+                continue
+            new_name = storage.save(name, ContentFile(data))
+            width, height = get_image_dimensions(ContentFile(data))
+            media.repoint(name, new_name, image_width=width,
+                          image_height=height)
+            self.stdout.write(f'{name} -> {new_name}: '
+                              f'{before} -> {len(data)} байт')
+        verb = 'Можно нормализовать' if options['dry_run'] else 'Нормализовано'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} картинок: {normalized}, сэкономлено байтов: {saved}'))
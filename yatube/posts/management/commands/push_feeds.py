@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = ('Раскладывает по лентам подписчиков посты авторов, которые '
+            'перестали быть популярными. Рассчитана на запуск по '
+            'расписанию: до раскладки посты таких авторов читаются '
+            'при показе ленты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Подписчиков в одной пачке')
+
+    def handle(self, *args, **options):
+        pushed = feed.push_pending(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Авторов: {pushed}'))
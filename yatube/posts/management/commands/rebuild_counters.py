@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов, подписок и комментариев с нуля'
+
+    def handle(self, *args, **options):
+        counters.rebuild()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
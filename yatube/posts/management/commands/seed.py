@@ -0,0 +1,199 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import caching, counters, feed, search
+from posts.gc import batches
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = ('утро', 'город', 'море', 'кофе', 'дорога', 'книга', 'музыка',
+         'кот', 'горы', 'снег', 'лето', 'поезд', 'друзья', 'работа',
+         'фото', 'ужин', 'парк', 'дождь', 'закат', 'код', 'выставка',
+         'велосипед', 'концерт', 'река', 'осень', 'сад', 'кино')
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now_add у полей fields, чтобы bulk_create
+    сохранил заданные даты, а не текущее время.
+    """
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def power_law(count, alpha):
+    """Накопленные веса рангов 1..count по закону 1 / rank ** alpha:
+    немногие первые получают большую часть выборок.
+    """
+    return list(accumulate(1 / rank ** alpha for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу пользователями, группами, постами, '
+            'комментариями и подписками через bulk_create. Популярность '
+            'авторов и постов распределена по степенному закону, часть '
+            'групп «горячие». Затем пересчитываются ленты подписок, '
+            'поисковый индекс и счетчики')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=3000000)
+        parser.add_argument('--follows', type=int, default=50,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--alpha', type=float, default=1.0,
+                            help='Показатель степенного закона '
+                                 'популярности авторов и постов')
+        parser.add_argument('--hot-groups', type=int, default=5,
+                            help='Число «горячих» групп')
+        parser.add_argument('--hot-share', type=float, default=0.5,
+                            help='Доля постов в «горячих» группах')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределены посты')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        with explicit_dates(Post._meta.get_field('pub_date'),
+                            Comment._meta.get_field('created')):
+            users = self.create_users()
+            groups = self.create_groups()
+            first_post, posts = self.create_posts(users, groups)
+            self.create_comments(users, posts)
+            self.create_follows(users)
+        self.stage('Поисковый индекс', search.index_new_posts, first_post)
+        self.stage('Ленты подписок', feed.rebuild)
+        self.stage('Счетчики', counters.rebuild, self.batch_size)
+        caching.bump('index')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'))
+
+    def stage(self, name, function, *args):
+        started = time.perf_counter()
+        function(*args)
+        self.stdout.write(f'{name}: {time.perf_counter() - started:.1f} с')
+
+    def bulk_create(self, name, model, objects, **kwargs):
+        started = time.perf_counter()
+        count = 0
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch, **kwargs)
+            count += len(batch)
+        self.stdout.write(f'{name}: {count} за '
+                          f'{time.perf_counter() - started:.1f} с')
+
+    def create_users(self):
+        prefix = f'seed{time.time_ns()}'
+        password = make_password(None)
+        self.bulk_create('Пользователи', User, (
+            User(username=f'{prefix}_{number}', password=password)
+            for number in range(self.options['users'])))
+        return list(User.objects.filter(username__startswith=prefix)
+                    .order_by('id').values_list('id', flat=True))
+
+    def create_groups(self):
+        prefix = f'seed{time.time_ns()}'
+        self.bulk_create('Группы', Group, (
+            Group(title=f'Группа {number}', slug=f'{prefix}-{number}',
+                  description='Сгенерированная группа')
+            for number in range(self.options['groups'])))
+        return list(Group.objects.filter(slug__startswith=prefix)
+                    .order_by('id').values_list('id', flat=True))
+
+    def text(self, low, high):
+        return ' '.join(self.random.choices(WORDS,
+                                            k=self.random.randint(low, high)))
+
+    def create_posts(self, users, groups):
+        """Посты по возрастанию даты, чтобы id шли в том же порядке.
+
+        Возвращает id первого поста и пары (id, дата) всех постов.
+        """
+        count = self.options['posts']
+        authors = power_law(len(users), self.options['alpha'])
+        hot = groups[:self.options['hot_groups']]
+        cold = groups[len(hot):] or hot
+        step = self.options['days'] * 24 * 60 * 60 / max(count, 1)
+        moment = timezone.now() - timedelta(days=self.options['days'])
+        dates = []
+
+        def posts():
+            nonlocal moment
+            for author_id in self.random.choices(users, cum_weights=authors,
+                                                 k=count):
+                moment += timedelta(seconds=self.random.expovariate(1 / step))
+                dates.append(moment)
+                group_id = None
+                if groups and self.random.random() < 0.8:
+                    group_id = self.random.choice(
+                        hot if self.random.random() < self.options['hot_share']
+                        else cold)
+                yield Post(text=self.text(5, 40), author_id=author_id,
+                           group_id=group_id, pub_date=moment)
+
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        self.bulk_create('Посты', Post, posts())
+        ids = list(Post.objects.filter(id__gt=last_id).order_by('id')
+                   .values_list('id', flat=True))
+        return last_id + 1, list(zip(ids, dates))
+
+    def create_comments(self, users, posts):
+        if not posts:
+            return
+        # Популярность постов не зависит от их возраста.
+        posts = posts[:]
+        self.random.shuffle(posts)
+        weights = power_law(len(posts), self.options['alpha'])
+        now = timezone.now()
+
+        def comments():
+            for post_id, pub_date in self.random.choices(
+                    posts, cum_weights=weights, k=self.options['comments']):
+                delay = timedelta(hours=self.random.expovariate(1 / 12))
+                yield Comment(post_id=post_id,
+                              author_id=self.random.choice(users),
+                              text=self.text(1, 20),
+                              created=min(pub_date + delay, now))
+
+        self.bulk_create('Комментарии', Comment, comments())
+
+    def create_follows(self, users):
+        """Подписки: число подписок пользователя распределено
+        экспоненциально, авторы выбираются по степенному закону, поэтому
+        у немногих авторов большая часть подписчиков.
+        """
+        authors = power_law(len(users), self.options['alpha'])
+        mean = self.options['follows']
+
+        def follows():
+            for user_id in users:
+                count = min(int(self.random.expovariate(1 / mean)),
+                            len(users) - 1) if mean else 0
+                chosen = set(self.random.choices(users, cum_weights=authors,
+                                                 k=count))
+                chosen.discard(user_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk_create('Подписки', Follow, follows(),
+                         ignore_conflicts=True)
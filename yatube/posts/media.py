@@ -0,0 +1,79 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import F
+
+from . import caching, counters
+from .models import MediaFile, Post
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def delete_grace():
+    return getattr(settings, 'MEDIA_DELETE_GRACE', 600)
+
+
+def is_fresh(name):
+    """Файл name сохраняли (или загружали повторно) меньше
+    MEDIA_DELETE_GRACE секунд назад.
+    """
+    try:
+        modified = os.path.getmtime(storage().path(name))
+    except OSError:
+        return False
+    return time.time() - modified < delete_grace()
+
+
+def retain(name):
+    """Добавляет ссылку поста на файл name."""
+    if name:
+        counters.change(MediaFile, name, refs=1)
+
+
+def release(name, count=1):
+    """Убирает count ссылок на файл name; файл без ссылок удаляется
+    после коммита транзакции.
+
+    Свежий файл остается сборщику (collect_media): его могли только что
+    загрузить снова для нового поста, который еще не взял ссылку
+    (см. ContentAddressedStorage.save).
+    """
+    if not name:
+        return
+    counters.change(MediaFile, name, refs=-count)
+
+    def delete():
+        if MediaFile.objects.filter(name=name, refs__gt=0).exists():
+            return
+        try:
+            if is_fresh(name):
+                return
+            storage().delete(name)
+        except SuspiciousFileOperation:
+            # Путь вне MEDIA_ROOT: такой файл хранилищу не принадлежит.
+            pass
+
+    transaction.on_commit(delete)
+
+
+def repoint(old_name, new_name, **fields):
+    """Переводит все посты с файла old_name на new_name вместе с их
+    ссылками и сбрасывает их карточки и ленты.
+    """
+    if old_name == new_name:
+        return 0
+    posts = Post.objects.filter(image=old_name)
+    scopes = set()
+    for post in posts.only('author_id', 'group_id'):
+        scopes.update(caching.post_scopes(post))
+    count = posts.update(image=new_name, version=F('version') + 1, **fields)
+    if count:
+        counters.change(MediaFile, new_name, refs=count)
+        release(old_name, count)
+        caching.bump(*scopes)
+    return count
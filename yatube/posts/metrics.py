@@ -0,0 +1,331 @@
+import atexit
+import fcntl
+import hmac
+import ipaddress
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_safe
+
+# Границы корзин гистограммы времени ответа, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Метрики в порядке вывода: имя -> (тип, описание).
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по имени URL'),
+    'yatube_responses_total': (
+        'counter', 'Ответы по имени URL и коду статуса'),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы по имени URL'),
+    'yatube_cache_hits_total': (
+        'counter', 'Попадания в кэш по имени URL'),
+    'yatube_cache_misses_total': (
+        'counter', 'Промахи кэша по имени URL'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_samples = defaultdict(float)
+_pid = None
+_flushed = 0.0
+_owns_file = False
+
+# Файл со счетчиками завершившихся процессов.
+ARCHIVE = 'archive.json'
+
+
+def directory():
+    """Каталог, куда каждый процесс пишет свои счетчики."""
+    return getattr(settings, 'METRICS_DIR',
+                   os.path.join(tempfile.gettempdir(), 'yatube-metrics'))
+
+
+def flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+
+
+def _networks(name):
+    return [ipaddress.ip_network(network) for network in getattr(
+        settings, name, ('127.0.0.0/8', '::1/128'))]
+
+
+def allowed_networks():
+    return _networks('METRICS_ALLOWED_NETWORKS')
+
+
+def trusted_proxies():
+    return _networks('METRICS_TRUSTED_PROXIES')
+
+
+def token():
+    return getattr(settings, 'METRICS_TOKEN', None)
+
+
+def _reset_after_fork():
+    # Процесс, порожденный fork, начинает со своих счетчиков: иначе
+    # счетчики родителя попадут в сумму дважды.
+    global _pid, _flushed, _owns_file
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _samples.clear()
+        _flushed = 0.0
+        _owns_file = False
+
+
+def observe(view, status, duration, queries=None, hits=None, misses=None):
+    """Учитывает ответ страницы view в счетчиках процесса."""
+    labels = (('view', view),)
+    with _lock:
+        _reset_after_fork()
+        for bound in BUCKETS:
+            _samples[('yatube_request_duration_seconds_bucket',
+                      labels + (('le', str(bound)),))] += duration <= bound
+        _samples[('yatube_request_duration_seconds_bucket',
+                  labels + (('le', '+Inf'),))] += 1
+        _samples[('yatube_request_duration_seconds_sum', labels)] += duration
+        _samples[('yatube_request_duration_seconds_count', labels)] += 1
+        _samples[('yatube_responses_total',
+                  labels + (('status', str(status)),))] += 1
+        if queries is not None:
+            _samples[('yatube_db_queries_total', labels)] += queries
+            _samples[('yatube_cache_hits_total', labels)] += hits
+            _samples[('yatube_cache_misses_total', labels)] += misses
+    if time.monotonic() - _flushed >= flush_interval():
+        flush()
+
+
+def _path(pid):
+    return os.path.join(directory(), f'{pid}.json')
+
+
+def _read(path):
+    """Счетчики из файла: {(имя, метки): значение}."""
+    with open(path) as file:
+        return {(name, tuple(map(tuple, labels))): value
+                for name, labels, value in json.load(file)}
+
+
+def _write(path, samples):
+    """Заменяет файл целиком, поэтому читатели не видят его
+    недописанным.
+    """
+    data = [[name, list(labels), value]
+            for (name, labels), value in samples.items()]
+    os.makedirs(directory(), exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory(), suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as temp:
+        json.dump(data, temp)
+    os.replace(temp_path, path)
+
+
+@contextmanager
+def _archive_lock():
+    os.makedirs(directory(), exist_ok=True)
+    with open(os.path.join(directory(), 'archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _archive(paths):
+    """Прибавляет счетчики из файлов paths к архиву и удаляет файлы.
+
+    Вызывается под _archive_lock(): файл, который уже слил другой
+    процесс, пропускается и не попадает в архив дважды.
+    """
+    archive_path = os.path.join(directory(), ARCHIVE)
+    try:
+        totals = defaultdict(float, _read(archive_path))
+    except FileNotFoundError:
+        totals = defaultdict(float)
+    merged = []
+    for path in paths:
+        try:
+            samples = _read(path)
+        except (OSError, ValueError):
+            continue
+        for key, value in samples.items():
+            totals[key] += value
+        merged.append(path)
+    if merged:
+        _write(archive_path, totals)
+        for path in merged:
+            os.remove(path)
+
+
+def flush():
+    """Записывает счетчики процесса в его файл в METRICS_DIR.
+
+    Файл с тем же PID, оставшийся от завершившегося процесса, перед
+    первой записью сливается в архив.
+    """
+    global _flushed, _owns_file
+    with _lock:
+        _reset_after_fork()
+        if not _samples:
+            return
+        samples = dict(_samples)
+        _flushed = time.monotonic()
+    path = _path(os.getpid())
+    if not _owns_file:
+        if os.path.exists(path):
+            with _archive_lock():
+                _archive([path])
+        _owns_file = True
+    _write(path, samples)
+
+
+atexit.register(flush)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect():
+    """Сумма счетчиков всех процессов: {(имя, метки): значение}.
+
+    Файлы завершившихся процессов сливаются в архив ARCHIVE, который
+    читается вместе с файлами живых: каталог не растет, а сумма не
+    уменьшается при перезапуске воркера (иначе Prometheus принял бы
+    ее за сброс счетчика и rate() дал бы скачок). METRICS_DIR должен
+    быть общим только для процессов одной машины.
+    """
+    totals = defaultdict(float)
+    if not os.path.isdir(directory()):
+        return totals
+    # Под блокировкой файл процесса не перейдет в архив между чтениями
+    # и не будет посчитан дважды или пропущен.
+    with _archive_lock():
+        live, dead = [], []
+        for filename in os.listdir(directory()):
+            pid, extension = os.path.splitext(filename)
+            if extension != '.json' or not pid.isdigit():
+                continue
+            path = os.path.join(directory(), filename)
+            (live if _is_running(int(pid)) else dead).append(path)
+        if dead:
+            _archive(dead)
+        for path in [os.path.join(directory(), ARCHIVE), *live]:
+            try:
+                samples = _read(path)
+            except (OSError, ValueError):
+                continue
+            for key, value in samples.items():
+                totals[key] += value
+    return totals
+
+
+def _escape(value):
+    return (value.replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render(samples):
+    """Счетчики в текстовом формате Prometheus."""
+    by_metric = defaultdict(list)
+    for (name, labels), value in samples.items():
+        family = next(metric for metric in METRICS if name.startswith(metric))
+        by_metric[family].append((name, labels, value))
+    lines = []
+    for family, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        for name, labels, value in sorted(by_metric[family],
+                                          key=_sort_key):
+            labels = ','.join(f'{key}="{_escape(label)}"'
+                              for key, label in labels)
+            lines.append(f'{name}{{{labels}}} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _sort_key(sample):
+    # Корзины гистограммы идут по возрастанию границы, +Inf последней.
+    name, labels, _ = sample
+    labels = dict(labels)
+    le = labels.pop('le', None)
+    bound = float('inf') if le in (None, '+Inf') else float(le)
+    return sorted(labels.items()), name, bound
+
+
+def client_address(request):
+    """Адрес клиента. Если запрос пришел от прокси из
+    METRICS_TRUSTED_PROXIES, адрес берется из X-Forwarded-For: последний
+    в цепочке, который не принадлежит доверенному прокси.
+    """
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    chain = [address.strip() for address in forwarded.split(',')
+             if address.strip()]
+    chain.append(request.META.get('REMOTE_ADDR', ''))
+    proxies = trusted_proxies()
+    while True:
+        try:
+            address = ipaddress.ip_address(chain.pop())
+        except ValueError:
+            return None
+        if not chain or not any(address in network for network in proxies):
+            return address
+
+
+def is_allowed(request):
+    expected = token()
+    if expected:
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(authorization.encode(),
+                               f'Bearer {expected}'.encode()):
+            return True
+    address = client_address(request)
+    return address is not None and any(
+        address in network for network in allowed_networks())
+
+
+@require_safe
+def export(request):
+    """Метрики всех процессов для Prometheus; доступны по токену
+    METRICS_TOKEN или с адресов METRICS_ALLOWED_NETWORKS.
+    """
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    flush()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Считает время ответа, коды статуса, а также SQL-запросы
+    и обращения к кэшу по замерам ProfilingMiddleware (если она
+    включена и стоит после этой) для каждого имени URL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        profile = getattr(request, 'profile', None)
+        observe(
+            match.view_name if match else 'unresolved',
+            response.status_code, duration,
+            *((profile.sql_count, profile.cache_hits, profile.cache_misses)
+              if profile else ()))
+        return response
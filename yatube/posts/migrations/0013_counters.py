@@ -0,0 +1,80 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_by(queryset, field):
+    return dict(queryset.order_by().values_list(field)
+                .annotate(count=models.Count('pk')))
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики по уже существующим данным.
+
+    Каждая связь считается отдельным GROUP BY: один запрос с JOIN
+    постов, подписок и комментариев перемножает строки.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    GroupCounter = apps.get_model('posts', 'GroupCounter')
+    counts = {
+        'posts': count_by(Post.objects, 'author'),
+        'followers': count_by(Follow.objects, 'author'),
+        'following': count_by(Follow.objects, 'user'),
+        'comments': count_by(Comment.objects, 'author'),
+    }
+    UserCounter.objects.bulk_create(
+        UserCounter(user_id=pk, **{name: values.get(pk, 0)
+                                   for name, values in counts.items()})
+        for pk in User.objects.values_list('pk', flat=True).iterator()
+    )
+    group_posts = count_by(Post.objects.exclude(group=None), 'group')
+    GroupCounter.objects.bulk_create(
+        GroupCounter(group_id=pk, posts=group_posts.get(pk, 0))
+        for pk in Group.objects.values_list('pk', flat=True).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_auto_20210705_1343'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupCounter',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='posts.Group', verbose_name='Сообщество')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+        ),
+        # Имя ограничения в модели расходилось с 0012: makemigrations
+        # привел его к имени из модели. К счетчикам это не относится.
+        migrations.RemoveConstraint(
+            model_name='follow',
+            name='unique_list',
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_followers'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
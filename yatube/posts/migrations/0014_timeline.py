@@ -0,0 +1,76 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    """Раскладывает уже опубликованные посты по лентам подписчиков
+    одним INSERT ... SELECT: в ленту каждого пользователя попадают
+    последние FEED_INBOX_LIMIT постов его авторов.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    limit = getattr(settings, 'FEED_INBOX_LIMIT', 1000)
+    timeline = TimelineEntry._meta.db_table
+    # Больше limit постов одного автора в ленту не попадет, поэтому
+    # с подписками соединяются только последние посты каждого автора.
+    recent = (f'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+              f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC) '
+              f'AS position FROM {Post._meta.db_table}')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {timeline} (user_id, post_id, author_id, pub_date) '
+            f'SELECT user_id, post_id, author_id, pub_date FROM ('
+            f'SELECT f.user_id, p.id AS post_id, p.author_id, p.pub_date, '
+            f'ROW_NUMBER() OVER (PARTITION BY f.user_id '
+            f'ORDER BY p.pub_date DESC, p.id DESC) AS position '
+            f'FROM {Follow._meta.db_table} f JOIN ({recent}) AS p '
+            f'ON p.author_id = f.author_id AND p.position <= %s'
+            f') AS entries WHERE position <= %s', [limit, limit])
+        cursor.execute(
+            f'UPDATE {UserCounter._meta.db_table} SET inbox = ('
+            f'SELECT COUNT(*) FROM {timeline} t '
+            f'WHERE t.user_id = {UserCounter._meta.db_table}.user_id)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='inbox',
+            field=models.PositiveIntegerField(default=0, verbose_name='Записей в ленте подписок'),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_post'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_index(apps, schema_editor):
+    """Создает FTS5-индекс постов и заполняет его (только SQLite)."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+        f"USING fts5(text, author, group_title, tokenize='unicode61')"
+    )
+    posts = Post.objects.select_related('author', 'group').iterator()
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, author, group_title) '
+            f'VALUES (%s, %s, %s, %s)',
+            ((post.id, post.text, post.author.username,
+              post.group.title if post.group_id else '') for post in posts)
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
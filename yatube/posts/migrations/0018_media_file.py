@@ -0,0 +1,40 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:16
+
+from django.db import migrations, models
+import posts.storage
+
+
+def fill_media_files(apps, schema_editor):
+    """Считает ссылки постов на уже загруженные картинки."""
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    Post = apps.get_model('posts', 'Post')
+    images = (Post.objects.exclude(image='').exclude(image=None)
+              .values('image').annotate(refs=models.Count('id'))
+              .order_by())
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=image['image'], refs=image['refs'])
+         for image in images)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_image_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
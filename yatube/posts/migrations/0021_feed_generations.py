@@ -0,0 +1,21 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedGeneration',
+            fields=[
+                ('scope', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Лента')),
+                ('generation', models.BigIntegerField(verbose_name='Поколение')),
+                ('modified', models.DateTimeField(verbose_name='Изменена')),
+            ],
+        ),
+    ]
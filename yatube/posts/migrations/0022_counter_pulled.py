@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_feed_generations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='pulled',
+            field=models.BooleanField(default=False, help_text='Автор перестал быть популярным, но его посты еще не разложены по лентам (команда push_feeds)', verbose_name='Посты читаются при показе ленты'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Coalesce
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -13,6 +16,26 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа выбираются тем же запросом,
+        число комментариев - аннотацией comment_count.
+
+        Число комментариев считается подзапросом по индексу
+        (post, created), а не JOIN с GROUP BY: так лента читается
+        индексом (pub_date, id) по порядку, без временной сортировки.
+        """
+        comment_count = (Comment.objects.filter(post=models.OuterRef('pk'))
+                         .order_by().values('post')
+                         .annotate(count=models.Count('pk'))
+                         .values('count'))
+        return (self.select_related('author', 'group')
+                .annotate(comment_count=Coalesce(
+                    models.Subquery(comment_count,
+                                    output_field=models.IntegerField()),
+                    0)))
+
+
 class Post(models.Model):
     text = models.TextField('Текст',
                             help_text='Введите текст поста')
@@ -24,10 +47,33 @@ class Post(models.Model):
                               verbose_name='Сообщество',
                               help_text='Выберите сообщество')
     image = models.ImageField('Изображение', upload_to='posts/',
+                              storage=ContentAddressedStorage(),
                               blank=True, null=True)
+    image_width = models.PositiveIntegerField(
+        'Ширина изображения', blank=True, null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота изображения', blank=True, null=True, editable=False)
+    image_placeholder = models.TextField(
+        'Заглушка изображения', blank=True, editable=False,
+        help_text='Размытая копия картинки в виде data URI')
+    version = models.PositiveIntegerField(
+        'Версия', default=0, editable=False,
+        help_text='Растет при изменении поста и его комментариев')
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        # Ленты выбираются по ключу (pub_date, id) от новых к старым:
+        # общая, автора и группы.
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='post_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=('group', '-pub_date', '-id'),
+                         name='post_group_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -43,6 +89,12 @@ class Comment(models.Model):
     created = models.DateTimeField('Дата и время публикации комментария',
                                    auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            models.Index(fields=('post', 'created', 'id'),
+                         name='comment_post_created_idx'),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -55,3 +107,99 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=('user', 'author'),
                                     name='unique_followers'),
         )
+        # Подписчики автора и проверка подписки на странице автора;
+        # подписки пользователя ищутся по уникальному (user, author).
+        indexes = (
+            models.Index(fields=('author', 'user'),
+                         name='follow_author_user_idx'),
+        )
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок (fan-out on write).
+
+    Пост попадает в ленты подписчиков при публикации, поэтому
+    /follow/ читает один диапазон индекса (user, -pub_date).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Читатель')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries',
+                             verbose_name='Пост')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+', verbose_name='Автор')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_post'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-post'),
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='timeline_user_author_idx'),
+        )
+
+
+class UserCounter(models.Model):
+    """Денормализованные счетчики пользователя.
+
+    Обновляются сигналами при записи Post, Follow и Comment,
+    пересчитываются командой rebuild_counters.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='counter',
+                                verbose_name='Пользователь')
+    posts = models.PositiveIntegerField('Записей', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+    inbox = models.PositiveIntegerField('Записей в ленте подписок',
+                                        default=0)
+    pulled = models.BooleanField(
+        'Посты читаются при показе ленты', default=False,
+        help_text='Автор перестал быть популярным, но его посты еще '
+                  'не разложены по лентам (команда push_feeds)')
+
+    @classmethod
+    def for_user(cls, user):
+        """Счетчики пользователя; без записи в таблице - нулевые."""
+        return (cls.objects.filter(user=user).first()
+                or cls(user=user))
+
+
+class GroupCounter(models.Model):
+    """Денормализованное число записей сообщества."""
+    group = models.OneToOneField(Group, on_delete=models.CASCADE,
+                                 primary_key=True, related_name='counter',
+                                 verbose_name='Сообщество')
+    posts = models.PositiveIntegerField('Записей', default=0)
+
+    @classmethod
+    def for_group(cls, group):
+        return (cls.objects.filter(group=group).first()
+                or cls(group=group))
+
+
+class MediaFile(models.Model):
+    """Файл картинки в ContentAddressedStorage и число постов,
+    которые на него ссылаются.
+    """
+    name = models.CharField('Имя файла', max_length=100, primary_key=True)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+
+class FeedGeneration(models.Model):
+    """Поколение ленты (главной, группы, автора) и время ее последнего
+    изменения.
+
+    Хранится в базе, а не в кэше процесса: запись в одном процессе
+    должна сразу сбрасывать закэшированные страницы и валидаторы
+    условного GET во всех.
+    """
+    scope = models.CharField('Лента', max_length=64, primary_key=True)
+    generation = models.BigIntegerField('Поколение')
+    modified = models.DateTimeField('Изменена')
@@ -0,0 +1,155 @@
+import base64
+import copy
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа строки в непрозрачный токен для URL."""
+    raw = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора. Для битого токена возвращает None."""
+    try:
+        padding = '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(token + padding))
+    except (TypeError, ValueError):
+        return None
+    # encode_cursor пишет только строки: все прочее - подделка.
+    if not isinstance(values, list) or not all(
+            isinstance(value, str) for value in values):
+        return None
+    return values
+
+
+def keyset_filter(ordering, values, backwards=False):
+    """Строит условие «строки строго после ключа values» для ordering.
+
+    Для ordering=('-pub_date', '-id') и backwards=False получается
+    pub_date < d OR (pub_date = d AND id < i).
+    """
+    condition = Q()
+    for index in reversed(range(len(ordering))):
+        name = ordering[index].lstrip('-')
+        descending = ordering[index].startswith('-')
+        lookup = 'lt' if descending != backwards else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[index]})
+        if index < len(ordering) - 1:
+            step |= Q(**{name: values[index]}) & condition
+        condition = step
+    return condition
+
+
+def seek(queryset, ordering, key=None, backwards=False, offset=0,
+         limit=None):
+    """Выбирает до limit строк queryset, идущих после ключа key.
+
+    При backwards=True строки идут в обратном порядке, ближайшие
+    к ключу - первыми.
+    """
+    if backwards:
+        ordering = [name[1:] if name.startswith('-') else f'-{name}'
+                    for name in ordering]
+    queryset = queryset.order_by(*ordering)
+    if key is not None:
+        queryset = queryset.filter(keyset_filter(ordering, key))
+    return list(queryset[offset:None if limit is None else offset + limit])
+
+
+class CursorPaginator(Paginator):
+    """Курсорный (keyset) паджинатор.
+
+    Вместо OFFSET и COUNT(*) страница выбирается условием по ключу
+    ordering относительно последней строки предыдущей страницы.
+    Возвращает обычный Page, поэтому шаблоны и тесты, работающие
+    с page, не меняются: number и num_pages подобраны так, чтобы
+    has_next/has_previous давали верный ответ.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.ordering = tuple(ordering)
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def row_key(self, row):
+        return [getattr(row, name.lstrip('-')) for name in self.ordering]
+
+    def parse_key(self, token):
+        """Приводит значения из токена к типам полей модели."""
+        values = decode_cursor(token) if token else None
+        if values is None or len(values) != len(self.ordering):
+            return None
+        if hasattr(self.object_list, 'parse_key'):
+            return self.object_list.parse_key(values)
+        model = self.object_list.model
+        try:
+            key = [model._meta.get_field(name.lstrip('-')).to_python(value)
+                   for name, value in zip(self.ordering, values)]
+        except (ValidationError, TypeError, ValueError):
+            return None
+        return None if None in key else key
+
+    def fetch(self, key=None, backwards=False, offset=0, limit=None):
+        if hasattr(self.object_list, 'seek'):
+            return self.object_list.seek(key, backwards, offset, limit)
+        return seek(self.object_list, self.ordering, key, backwards,
+                    offset, limit)
+
+    def get_page(self, number=None, after=None, before=None):
+        """Возвращает страницу после курсора after, перед курсором before
+        или, для старых ссылок ?page=N, по номеру страницы.
+        """
+        size = self.per_page + 1
+        before_key = self.parse_key(before)
+        if before_key is not None:
+            rows = self.fetch(before_key, backwards=True, limit=size)
+            has_previous, has_next = len(rows) > self.per_page, True
+            rows = list(reversed(rows[:self.per_page]))
+            return self._build_page(rows, has_previous, has_next)
+        after_key = self.parse_key(after)
+        if after_key is not None:
+            rows = self.fetch(after_key, limit=size)
+            return self._build_page(rows[:self.per_page], True,
+                                    len(rows) > self.per_page)
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = self.fetch(offset=offset, limit=size)
+        if not rows and number > 1:
+            return self.get_page()
+        return self._build_page(rows[:self.per_page], number > 1,
+                                len(rows) > self.per_page, number)
+
+    def _build_page(self, rows, has_previous, has_next, number=None):
+        if number is None:
+            number = 2 if has_previous else 1
+        # У каждой страницы свой экземпляр паджинатора: num_pages
+        # описывает только соседей этой страницы.
+        paginator = copy.copy(self)
+        paginator._num_pages = number + has_next
+        page = Page(rows, number, paginator)
+        page.next_cursor = (encode_cursor(self.row_key(rows[-1]))
+                            if rows and has_next else None)
+        page.previous_cursor = (encode_cursor(self.row_key(rows[0]))
+                                if rows and has_previous else None)
+        return page
+
+
+def paginate(request, object_list, per_page, **kwargs):
+    """Страница object_list по параметрам запроса after/before/page."""
+    paginator = CursorPaginator(object_list, per_page, **kwargs)
+    return paginator.get_page(request.GET.get('page'),
+                              after=request.GET.get('after'),
+                              before=request.GET.get('before'))
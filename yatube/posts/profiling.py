@@ -0,0 +1,217 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_installed = False
+_MISSING = object()
+
+
+def enabled():
+    return getattr(settings, 'PROFILING_ENABLED', False)
+
+
+def log_sample_rate():
+    return getattr(settings, 'PROFILING_LOG_SAMPLE_RATE', 0.01)
+
+
+def shows_server_timing(request):
+    """Заголовок Server-Timing раскрывает число запросов и время SQL:
+    он отдается только туда же, куда /metrics, и персоналу.
+    """
+    if metrics.is_allowed(request):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class Profile:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.in_cache = False
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'total_ms': round(1000 * self.elapsed(), 3),
+            'sql_count': self.sql_count,
+            'sql_ms': round(1000 * self.sql_time, 3),
+            'template_ms': round(1000 * self.template_time, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_ms': round(1000 * self.cache_time, 3),
+        }
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'sql;dur={1000 * self.sql_time:.1f};'
+            f'desc="{self.sql_count} queries"',
+            f'template;dur={1000 * self.template_time:.1f}',
+            f'cache;dur={1000 * self.cache_time:.1f};'
+            f'desc="{self.cache_hits} hits / {self.cache_misses} misses"',
+            f'total;dur={1000 * self.elapsed():.1f}',
+        ))
+
+
+def current():
+    """Замеры запроса, который обрабатывает текущий поток, или None."""
+    return getattr(_local, 'profile', None)
+
+
+def _execute(execute, sql, params, many, context):
+    profile = current()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_time += time.perf_counter() - started
+        profile.sql_count += 1
+
+
+def _wrap_render(render):
+    def wrapper(self, context):
+        profile = current()
+        if profile is None or profile.template_depth:
+            # Вложенные шаблоны (include, extends) входят во время
+            # внешнего.
+            return render(self, context)
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_time += time.perf_counter() - started
+            profile.template_depth -= 1
+    wrapper.__wrapped__ = render
+    return wrapper
+
+
+def _wrap_cache_get(get):
+    def wrapper(self, key, default=None, version=None):
+        profile = current()
+        if profile is None or profile.in_cache:
+            return get(self, key, default, version)
+        profile.in_cache = True
+        started = time.perf_counter()
+        try:
+            value = get(self, key, _MISSING, version)
+        finally:
+            profile.cache_time += time.perf_counter() - started
+            profile.in_cache = False
+        if value is _MISSING:
+            profile.cache_misses += 1
+            return default
+        profile.cache_hits += 1
+        return value
+    wrapper.__wrapped__ = get
+    return wrapper
+
+
+def _wrap_cache_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        profile = current()
+        if profile is None or profile.in_cache:
+            return get_many(self, keys, version)
+        # Базовый get_many вызывает get: он не должен считаться дважды.
+        keys = list(keys)
+        profile.in_cache = True
+        started = time.perf_counter()
+        try:
+            values = get_many(self, keys, version)
+        finally:
+            profile.cache_time += time.perf_counter() - started
+            profile.in_cache = False
+        profile.cache_hits += len(values)
+        profile.cache_misses += len(keys) - len(values)
+        return values
+    wrapper.__wrapped__ = get_many
+    return wrapper
+
+
+def install():
+    """Подключает замеры к рендеру шаблонов и чтению из кэшей.
+
+    Обертки работают только внутри запроса, который профилируется;
+    в остальных случаях они сразу вызывают исходный метод.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    Template.render = _wrap_render(Template.render)
+    for backend in {type(caches[alias]) for alias in settings.CACHES}:
+        backend.get = _wrap_cache_get(backend.get)
+        backend.get_many = _wrap_cache_get_many(backend.get_many)
+
+
+class ProfilingMiddleware:
+    """Замеряет для каждого запроса SQL (число запросов и время), рендер
+    шаблонов и обращения к кэшу, отдает их в заголовке Server-Timing
+    (только внутренним адресам и персоналу, см. shows_server_timing)
+    и пишет доли PROFILING_LOG_SAMPLE_RATE запросов в журнал
+    posts.profiling одной JSON-строкой независимо от заголовка.
+
+    При PROFILING_ENABLED = False middleware отключается при запуске
+    и не добавляет к запросам никакой работы.
+    """
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = _local.profile = Profile()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_execute))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        request.profile = profile
+        if shows_server_timing(request):
+            response['Server-Timing'] = profile.server_timing()
+        if random.random() < log_sample_rate():
+            self.log(request, response, profile)
+        return response
+
+    def log(self, request, response, profile):
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'url_name': match.view_name if match else None,
+            'status': response.status_code,
+            **profile.as_dict(),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False),
+                    extra={'profile': record})
@@ -0,0 +1,96 @@
+import fcntl
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import urlencode
+from PIL import Image, ImageOps
+
+from . import uploads
+from .models import Post
+
+# Уменьшенные картинки лежат в MEDIA_ROOT/r/<w>x<h>/<имя>, то есть
+# по тому же пути, что и URL: веб-сервер может отдавать их сам.
+CACHE_DIR = 'r'
+
+
+def max_side():
+    return getattr(settings, 'RESIZE_MAX_SIDE', 1920)
+
+
+def signature(width, height, name):
+    return salted_hmac('posts.resize',
+                       f'{width}x{height}/{name}').hexdigest()[:20]
+
+
+def is_valid(width, height, name, token):
+    return (0 < width <= max_side() and 0 < height <= max_side()
+            and constant_time_compare(signature(width, height, name),
+                                      token or ''))
+
+
+def url(name, width, height):
+    """Подписанная ссылка на картинку name, уменьшенную до width x height."""
+    path = reverse('resized_image', kwargs={
+        'width': width, 'height': height, 'name': name})
+    return f'{path}?{urlencode({"s": signature(width, height, name)})}'
+
+
+def render(source, target, width, height):
+    """Уменьшает source до width x height с обрезкой по центру
+    (без увеличения) и атомарно записывает результат в target.
+    """
+    with Image.open(source) as image:
+        format_ = image.format
+        image.draft('RGB', (width, height))
+        image = ImageOps.exif_transpose(image)
+    size = (min(width, image.width), min(height, image.height))
+    image = ImageOps.fit(image, size, Image.LANCZOS)
+    params = {'optimize': True}
+    if format_ in ('JPEG', 'WEBP'):
+        params['quality'] = uploads.quality()
+    if format_ == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    temporary = f'{target}.{os.getpid()}.tmp'
+    image.save(temporary, format_, **params)
+    os.replace(temporary, target)
+
+
+def resized(name, width, height):
+    """Путь к картинке name, уменьшенной до width x height; при первом
+    обращении она создается и сохраняется на диск.
+
+    Одновременные запросы одного варианта из всех потоков и процессов
+    ждут одной блокировки, и картинка уменьшается ровно один раз.
+    """
+    target = default_storage.path(f'{CACHE_DIR}/{width}x{height}/{name}')
+    if os.path.exists(target):
+        return target
+    source = Post._meta.get_field('image').storage.path(name)
+    if not os.path.exists(source):
+        raise FileNotFoundError(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    lock_path = f'{target}.lock'
+    with open(lock_path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Пока ждали блокировку, картинку мог создать другой запрос.
+            if not os.path.exists(target):
+                render(source, target, width, height)
+                os.remove(lock_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return target
+
+
+def purge(name):
+    """Удаляет все уменьшенные копии картинки name."""
+    root = default_storage.path(CACHE_DIR)
+    if not os.path.isdir(root):
+        return
+    for size in os.listdir(root):
+        path = default_storage.path(f'{CACHE_DIR}/{size}/{name}')
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,132 @@
+import re
+
+from django.db import connection
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def available():
+    """Полнотекстовый индекс есть только в SQLite (FTS5)."""
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Превращает пользовательский запрос в безопасное выражение FTS5:
+    каждое слово ищется по префиксу, все слова обязательны.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_posts(posts):
+    """Добавляет или обновляет посты в поисковом индексе."""
+    if not available():
+        return
+    rows = [(post.id, post.text, post.author.username,
+             post.group.title if post.group_id else '')
+            for post in posts]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, author, group_title) '
+            f'VALUES (%s, %s, %s, %s)', rows)
+
+
+def index_new_posts(first_id):
+    """Добавляет в индекс все посты с id от first_id одним запросом.
+
+    Для постов, загруженных мимо сигналов (bulk_create): их еще нет
+    в индексе, поэтому старые строки не удаляются.
+    """
+    if not available():
+        return
+    user = Post._meta.get_field('author').related_model._meta.db_table
+    group = Post._meta.get_field('group').related_model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, author, group_title) '
+            f"SELECT p.id, p.text, u.username, COALESCE(g.title, '') "
+            f'FROM {Post._meta.db_table} p '
+            f'JOIN {user} u ON u.id = p.author_id '
+            f'LEFT JOIN {group} g ON g.id = p.group_id '
+            f'WHERE p.id >= %s', [first_id])
+
+
+def remove_post(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [post_id])
+
+
+def filter_queryset(queryset, query):
+    """Оставляет в queryset посты, найденные по индексу.
+
+    Одним запросом, без выгрузки id в Python: так индекс используется
+    и в админке.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return queryset
+    if not available():
+        return queryset.filter(text__icontains=query)
+    return queryset.extra(
+        where=[f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE} '
+               f'WHERE {FTS_TABLE} MATCH %s)'],
+        params=[expression]
+    )
+
+
+class SearchResults:
+    """Источник для CursorPaginator: посты, найденные по запросу,
+    по убыванию релевантности (bm25), при равенстве - новые первыми.
+
+    Ключ курсора - (search_rank, id); search_rank проставляется
+    найденным постам.
+    """
+    model = Post
+    ordering = ('search_rank', '-id')
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+
+    def parse_key(self, values):
+        try:
+            return [float(values[0]), int(values[1])]
+        except (TypeError, ValueError):
+            return None
+
+    def seek(self, key=None, backwards=False, offset=0, limit=None):
+        if not self.expression:
+            return []
+        where, params = '', [self.expression]
+        if key is not None:
+            rank, post_id = key
+            if backwards:
+                where = 'AND (rank < %s OR (rank = %s AND rowid > %s))'
+            else:
+                where = 'AND (rank > %s OR (rank = %s AND rowid < %s))'
+            params += [rank, rank, post_id]
+        order = 'rank DESC, rowid ASC' if backwards else 'rank, rowid DESC'
+        params += [-1 if limit is None else limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, rank FROM ('
+                f'SELECT rowid, bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s) WHERE 1 {where} '
+                f'ORDER BY {order} LIMIT %s OFFSET %s', params)
+            found = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk(
+            [post_id for post_id, _ in found])
+        rows = []
+        for post_id, rank in found:
+            if post_id in posts:
+                posts[post_id].search_rank = rank
+                rows.append(posts[post_id])
+        return rows
@@ -0,0 +1,292 @@
+from django.contrib.auth import get_user_model
+from django.core.files.images import get_image_dimensions
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import caching, counters, feed, media, search, uploads
+from .models import (Comment, Follow, Group, GroupCounter, Post,
+                     UserCounter)
+
+User = get_user_model()
+
+# Поля пользователя, которые показываются в постах, лентах и комментариях.
+USER_NAMES = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминает прежние группу, автора и картинку поста, чтобы
+    перенести счетчики записей, ленты подписок и ссылку на файл.
+    """
+    instance._old_group_id = instance._old_image = None
+    instance._old_author_id = None
+    if instance.pk is not None:
+        (instance._old_group_id, instance._old_author_id,
+         instance._old_image) = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'author_id', 'image').first()
+            or (None, None, None)
+        )
+
+
+def author_changed(instance):
+    old = getattr(instance, '_old_author_id', None)
+    return old is not None and old != instance.author_id
+
+
+@receiver(pre_save, sender=Post)
+def prepare_post_image(sender, instance, **kwargs):
+    """Нормализует новую картинку поста до сохранения файла и
+    запоминает ее размеры, чтобы не создавать варианты шире оригинала,
+    и размытую заглушку для ленивой загрузки.
+    """
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+    elif not instance.image._committed:
+        uploads.normalize_field(instance.image)
+        (instance.image_width,
+         instance.image_height) = get_image_dimensions(instance.image)
+        instance.image_placeholder = uploads.placeholder(instance.image)
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_version(sender, instance, created, **kwargs):
+    # Версия сохранена выражением (см. bump_post_version): остальные
+    # обработчики и view должны видеть число.
+    if hasattr(instance.version, 'resolve_expression'):
+        instance.refresh_from_db(fields=['version'])
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change(UserCounter, instance.author_id, posts=1)
+        counters.change(GroupCounter, instance.group_id, posts=1)
+        return
+    if instance._old_group_id != instance.group_id:
+        counters.change(GroupCounter, instance._old_group_id, posts=-1)
+        counters.change(GroupCounter, instance.group_id, posts=1)
+    if author_changed(instance):
+        counters.change(UserCounter, instance._old_author_id, posts=-1)
+        counters.change(UserCounter, instance.author_id, posts=1)
+
+
+@receiver(post_save, sender=Post)
+def retain_post_image(sender, instance, created, **kwargs):
+    if created:
+        media.retain(instance.image.name)
+    elif instance._old_image != instance.image.name:
+        media.retain(instance.image.name)
+        media.release(instance._old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    media.release(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change(UserCounter, instance.author_id, posts=-1)
+    counters.change(GroupCounter, instance.group_id, posts=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(UserCounter, instance.author_id, comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change(UserCounter, instance.author_id, comments=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change(UserCounter, instance.author_id, followers=1)
+        counters.change(UserCounter, instance.user_id, following=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change(UserCounter, instance.author_id, followers=-1)
+    counters.change(UserCounter, instance.user_id, following=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+    elif author_changed(instance):
+        feed.move(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance.id)
+
+
+@receiver(post_save, sender=Group)
+def reindex_group(sender, instance, created, update_fields, **kwargs):
+    if not created and (update_fields is None or 'title' in update_fields):
+        search.index_posts(instance.posts.select_related('author', 'group'))
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежние логин, имя и фамилию пользователя: индекс,
+    версии постов и ленты обновляются, только если они изменились,
+    а не при любом сохранении (вход, смена пароля, правка в админке).
+    """
+    instance._old_names = None
+    if instance.pk is None or (update_fields is not None
+                               and not set(USER_NAMES) & set(update_fields)):
+        return
+    instance._old_names = (User.objects.filter(pk=instance.pk)
+                           .values(*USER_NAMES).first())
+
+
+def names_changed(instance, *fields):
+    old = getattr(instance, '_old_names', None)
+    return old is not None and any(
+        old[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=User)
+def reindex_author(sender, instance, **kwargs):
+    if names_changed(instance, 'username'):
+        search.index_posts(instance.posts.select_related('author', 'group'))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    scopes = caching.post_scopes(
+        instance, getattr(instance, '_old_group_id', None))
+    if author_changed(instance):
+        scopes.append(f'author:{instance._old_author_id}')
+    caching.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    caching.bump(*caching.post_scopes(instance.post))
+
+
+@receiver(pre_save, sender=Post)
+def bump_post_version(sender, instance, raw=False, **kwargs):
+    """Новая версия поста сбрасывает его закэшированную карточку.
+
+    Версия увеличивается в базе выражением F(), а не от значения,
+    загруженного до правки: иначе сдвиг версии комментарием между
+    загрузкой и сохранением дал бы двум записям один номер. Новый пост
+    (в том числе с заданным pk) и загрузка фикстуры сохраняют версию
+    как есть: выражение нельзя вставить в INSERT.
+    """
+    if instance.pk is not None and not raw and not instance._state.adding:
+        instance.version = F('version') + 1
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_commented_post_version(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # Счетчики подписок и кнопка подписки на страницах автора.
+    caching.bump(f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feeds(sender, instance, created, update_fields,
+                           **kwargs):
+    if created:
+        return
+    scopes = [f'group:{instance.id}']
+    if update_fields is None or 'title' in update_fields:
+        # Название группы есть в карточках ее постов во всех лентах.
+        author_ids = (instance.posts.order_by()
+                      .values_list('author_id', flat=True).distinct())
+        scopes += ['index', *(f'author:{pk}' for pk in author_ids)]
+    caching.bump(*scopes)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, **kwargs):
+    if not names_changed(instance, *USER_NAMES):
+        return
+    group_ids = (instance.posts.exclude(group=None).order_by()
+                 .values_list('group_id', flat=True).distinct())
+    # Имя есть и в комментариях на страницах чужих постов.
+    author_ids = (Post.objects.filter(comments__author=instance).order_by()
+                  .values_list('author_id', flat=True).distinct())
+    caching.bump('index', f'author:{instance.id}',
+                 *(f'group:{pk}' for pk in group_ids),
+                 *(f'author:{pk}' for pk in author_ids))
+
+
+@receiver(post_save, sender=Group)
+def bump_group_posts_version(sender, instance, created, update_fields,
+                             **kwargs):
+    if not created and (update_fields is None or 'title' in update_fields):
+        instance.posts.update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=User)
+def bump_author_posts_version(sender, instance, **kwargs):
+    if names_changed(instance, 'username'):
+        instance.posts.update(version=F('version') + 1)
+        # Имя автора есть и в закэшированных страницах комментариев.
+        Post.objects.filter(comments__author=instance).update(
+            version=F('version') + 1)
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    """Запоминает посты удаляемой группы: их group обнулит UPDATE
+    без сигналов Post.
+    """
+    posts = instance.posts.order_by()
+    instance._post_ids = list(posts.values_list('id', flat=True))
+    instance._author_ids = list(
+        posts.values_list('author_id', flat=True).distinct())
+
+
+@receiver(post_delete, sender=Group)
+def forget_group(sender, instance, **kwargs):
+    """Сбрасывает карточки, ленты и поисковый индекс постов удаленной
+    группы: в них осталась ссылка на ее страницу и ее название.
+    """
+    post_ids = getattr(instance, '_post_ids', [])
+    if not post_ids:
+        return
+    posts = Post.objects.filter(pk__in=post_ids)
+    posts.update(version=F('version') + 1)
+    caching.bump('index', f'group:{instance.id}',
+                 *(f'author:{pk}' for pk in instance._author_ids))
+    search.index_posts(posts.select_related('author', 'group'))
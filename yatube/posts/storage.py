@@ -0,0 +1,59 @@
+import hashlib
+import os
+import posixpath
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище картинок постов, где имя файла - SHA-256 содержимого.
+
+    posts/photo.jpg сохраняется как posts/ab/cd/abcd...ef.jpg: файлы
+    разложены по вложенным каталогам, а одинаковые картинки хранятся
+    один раз. Сколько постов ссылается на файл, считает MediaFile
+    (см. posts.media); файл с живыми ссылками не удаляется.
+    """
+    shard_levels = 2
+    shard_width = 2
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        shards = [digest[level * self.shard_width:
+                         (level + 1) * self.shard_width]
+                  for level in range(self.shard_levels)]
+        extension = os.path.splitext(name)[1].lower()
+        # Каталог upload_to без шардов, если name уже из хранилища.
+        directory = posixpath.dirname(name).split('/')[0]
+        return posixpath.join(directory, *shards, digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от сборщика
+            # (posts.gc) и от удаления с последней ссылкой
+            # (posts.media.release), пока новый пост с ним еще
+            # не сохранен.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def delete(self, name):
+        """Удаляет файл, только если на него не ссылается ни один пост."""
+        MediaFile = apps.get_model('posts', 'MediaFile')
+        if MediaFile.objects.filter(name=name, refs__gt=0).exists():
+            return
+        super().delete(name)
+        MediaFile.objects.filter(name=name).delete()
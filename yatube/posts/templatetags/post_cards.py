@@ -0,0 +1,58 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .. import thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_card.html'
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(post):
+    return f'post_card:{post.id}:{post.version}'
+
+
+def render_card(post):
+    return render_to_string(CARD_TEMPLATE, {'post': post})
+
+
+@register.simple_tag
+def prefetch_post_cards(posts):
+    """Достает карточки всех постов страницы одним get_many,
+    дорисовывает недостающие и сохраняет их одним set_many.
+
+    Миниатюры для недостающих карточек ищутся заранее одним
+    пакетным запросом, а не по одному на карточку.
+    """
+    posts = list(posts)
+    cached = cache.get_many([card_key(post) for post in posts])
+    stale = [post for post in posts if card_key(post) not in cached]
+    thumbnails.prefetch(stale)
+    missing = {}
+    for post in stale:
+        cached[card_key(post)] = missing[card_key(post)] = render_card(post)
+    for post in posts:
+        post.card_html = cached[card_key(post)]
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    return ''
+
+
+@register.simple_tag
+def post_card(post):
+    """Карточка поста без кнопок, зависящих от читателя.
+
+    Ключ содержит версию поста, поэтому правка поста или новый
+    комментарий сбрасывают только его карточку.
+    """
+    html = getattr(post, 'card_html', None)
+    if html is None:
+        key = card_key(post)
+        html = cache.get(key)
+        if html is None:
+            html = render_card(post)
+            cache.set(key, html, CARD_TIMEOUT)
+    return mark_safe(html)
@@ -0,0 +1,70 @@
+from django import template
+
+from .. import resize, thumbnails
+
+register = template.Library()
+
+IMAGE_TEMPLATE = 'includes/post_image.html'
+# Ширина карточки: на узких экранах картинка во всю ширину окна.
+IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+FALLBACK_WIDTH = 960
+FALLBACK_HEIGHT = 339
+MIME_TYPES = {
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+}
+
+
+@register.inclusion_tag(IMAGE_TEMPLATE)
+def post_image(post):
+    """Картинка поста тегом <picture>: по srcset на WebP и на формат
+    оригинала, браузер выбирает наименьший подходящий вариант.
+
+    Еще не созданные варианты пропускаются и ставятся в очередь одной
+    задачей; пока не готов ни один, картинка берется по подписанной
+    ссылке на уменьшение по запросу (см. posts.resize).
+
+    Картинка грузится лениво, а до загрузки на ее месте размытая
+    заглушка из Post.image_placeholder.
+    """
+    if not post.image:
+        return {}
+    backend = thumbnails.BackgroundThumbnailBackend()
+    sources, missing = {}, []
+    for geometry, options in thumbnails.variants(post):
+        thumbnail = backend.lookup(post.image, geometry, options)
+        if thumbnail:
+            sources.setdefault(options['format'], []).append(thumbnail)
+        else:
+            missing.append((geometry, options))
+    if missing:
+        thumbnails.schedule(post.image, missing)
+    context = {'placeholder': post.image_placeholder}
+    if not sources:
+        img = {'url': resize.url(post.image.name, FALLBACK_WIDTH,
+                                 FALLBACK_HEIGHT)}
+        if post.image_width and post.image_height:
+            # Без увеличения, как в posts.resize.render.
+            img['width'] = min(FALLBACK_WIDTH, post.image_width)
+            img['height'] = min(FALLBACK_HEIGHT, post.image_height)
+        context['img'] = img
+        return context
+    formats = list(sources)
+    # Последним идет формат оригинала: он же отдается в <img>.
+    fallback = sources[formats[-1]]
+    img = min(fallback, key=lambda im: abs(im.width - FALLBACK_WIDTH))
+    context.update({
+        'sources': [
+            {
+                'type': MIME_TYPES[format_],
+                'srcset': ', '.join(f'{im.url} {im.width}w'
+                                    for im in sources[format_]),
+            }
+            for format_ in formats
+        ],
+        'img': img,
+        'sizes': IMAGE_SIZES,
+    })
+    return context
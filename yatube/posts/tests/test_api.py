@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+from ..views import POSTS_PER_PAGE
+
+User = get_user_model()
+
+
+class PostsAPITest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        PostsAPITest.user = User.objects.create(username='test_user')
+        PostsAPITest.reader = User.objects.create(username='reader')
+        PostsAPITest.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Описание тестовой группы'
+        )
+        for number in range(POSTS_PER_PAGE + 3):
+            post = Post.objects.create(text=f'Пост {number}',
+                                       author=PostsAPITest.user,
+                                       group=PostsAPITest.group)
+        PostsAPITest.post = post
+        post.comments.create(text='Комментарий', author=PostsAPITest.reader)
+        Follow.objects.create(user=PostsAPITest.reader,
+                              author=PostsAPITest.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(PostsAPITest.reader)
+
+    def test_feeds_are_paginated_by_cursor(self):
+        """Ленты отдают по 10 постов и ссылку на следующую страницу."""
+        urls = (
+            reverse('api_index'),
+            reverse('api_group_posts', kwargs={'slug': 'test-group'}),
+            reverse('api_profile', kwargs={'username': 'test_user'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.guest_client.get(url).json()
+                self.assertEqual(len(data['results']), POSTS_PER_PAGE)
+                self.assertEqual(data['results'][0]['text'], 'Пост 12')
+                self.assertIsNone(data['previous'])
+                data = self.guest_client.get(data['next']).json()
+                self.assertEqual([post['text'] for post in data['results']],
+                                 ['Пост 2', 'Пост 1', 'Пост 0'])
+                self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        """fields= оставляет в ответе только запрошенные поля и
+        переносится в ссылку на следующую страницу.
+        """
+        data = self.guest_client.get(reverse('api_index'),
+                                     {'fields': 'id,author'}).json()
+        self.assertEqual(data['results'][0], {'id': PostsAPITest.post.id,
+                                              'author': 'test_user'})
+        self.assertIn('fields=id%2Cauthor', data['next'])
+        response = self.guest_client.get(reverse('api_index'),
+                                         {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag(self):
+        """Неизменившаяся страница отдается ответом 304."""
+        response = self.guest_client.get(reverse('api_index'))
+        etag = response['ETag']
+        response = self.guest_client.get(reverse('api_index'),
+                                         HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=PostsAPITest.user)
+        response = self.guest_client.get(reverse('api_index'),
+                                         HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_with_comments(self):
+        """Пост отдается с первой страницей комментариев."""
+        post = PostsAPITest.post
+        data = self.guest_client.get(reverse('api_post', kwargs={
+            'username': 'test_user', 'post_id': post.id})).json()
+        self.assertEqual(data['group'], 'test-group')
+        self.assertEqual(data['comment_count'], 1)
+        self.assertEqual(data['comments']['results'][0]['author'], 'reader')
+        self.assertIsNone(data['comments']['next'])
+
+    def test_follow_index(self):
+        """Лента подписок доступна только авторизованному."""
+        url = reverse('api_follow_index')
+        self.assertEqual(self.guest_client.get(url).status_code, 401)
+        data = self.reader_client.get(url).json()
+        self.assertEqual(data['results'][0]['text'], 'Пост 12')
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """Сериализация не делает запросов на каждый пост."""
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('api_index'), {'fields': 'id'})
+        small = len(queries)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('api_index'))
+        self.assertEqual(len(queries), small)
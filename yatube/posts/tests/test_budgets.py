@@ -0,0 +1,182 @@
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from about import urls as about_urls
+from users import urls as users_urls
+
+from .. import resize
+from .. import urls as posts_urls
+from ..budgets import BUDGETS, budget_for
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def url_names():
+    """Имена всех URL приложений posts, users и about."""
+    names = []
+    for module in (posts_urls, users_urls, about_urls):
+        namespace = getattr(module, 'app_name', None)
+        for pattern in module.urlpatterns:
+            names.append(f'{namespace}:{pattern.name}' if namespace
+                         else pattern.name)
+    return names
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ViewBudgetTest(TestCase):
+    """Страницы укладываются в бюджеты posts.budgets на базе,
+    наполненной командой seed. Размер базы задается настройкой
+    BUDGET_TEST_SEED (аргументы seed), по умолчанию SEED.
+    """
+    SEED = {'users': 100, 'groups': 10, 'posts': 2000, 'comments': 5000,
+            'follows': 10, 'hot_groups': 2}
+    FOLLOWED = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed', stdout=StringIO(),
+                     **getattr(settings, 'BUDGET_TEST_SEED', cls.SEED))
+        authors = list(User.objects.filter(counter__posts__gt=0)
+                       .order_by('-counter__posts', 'id'))
+        reader = User.objects.create(username='reader')
+        for author in authors[:cls.FOLLOWED]:
+            Follow.objects.create(user=reader, author=author)
+        group = Group.objects.order_by('-counter__posts', 'id').first()
+        post = (Post.objects.annotate(comment_count=Count('comments'))
+                .order_by('-comment_count', '-id').first())
+        image_post = Post.objects.create(
+            text='Пост с картинкой', author=authors[0], group=group,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif'))
+        ViewBudgetTest.authors = authors
+        ViewBudgetTest.reader = reader
+        ViewBudgetTest.group = group
+        ViewBudgetTest.post = post
+        ViewBudgetTest.image_post = image_post
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(ViewBudgetTest.reader)
+        self.author_client = Client()
+        self.author_client.force_login(ViewBudgetTest.post.author)
+
+    def requests(self):
+        """Запрос каждой страницы: имя URL -> (клиент, метод, адрес,
+        данные). Адрес действия, меняющего состояние, - функция: каждый
+        вызов дает новую цель, чтобы замер не попал на повтор, который
+        ничего не делает.
+        """
+        post = ViewBudgetTest.post
+        author = ViewBudgetTest.authors[0].username
+        slug = ViewBudgetTest.group.slug
+        post_kwargs = {'username': post.author.username, 'post_id': post.id}
+        cursor = self.reader_client.get(
+            reverse('post', kwargs=post_kwargs)).context['next_cursor']
+        image = ViewBudgetTest.image_post.image.name
+        to_follow = iter(ViewBudgetTest.authors[self.FOLLOWED:])
+        to_unfollow = iter(ViewBudgetTest.authors[:self.FOLLOWED])
+        reader, get = self.reader_client, 'get'
+        return {
+            'index': (reader, get, reverse('index'), None),
+            'new_post': (reader, get, reverse('new_post'), None),
+            'follow_index': (reader, get, reverse('follow_index'), None),
+            'search': (reader, get, reverse('search'), {'q': 'город'}),
+            'resized_image': (reader, get, resize.url(image, 2, 1), None),
+            'api_index': (reader, get, reverse('api_index'), None),
+            'api_follow_index': (reader, get, reverse('api_follow_index'),
+                                 None),
+            'api_group_posts': (reader, get, reverse(
+                'api_group_posts', kwargs={'slug': slug}), None),
+            'api_profile': (reader, get, reverse(
+                'api_profile', kwargs={'username': author}), None),
+            'api_post': (reader, get, reverse('api_post',
+                                              kwargs=post_kwargs), None),
+            'api_post_comments': (reader, get, reverse(
+                'api_post_comments', kwargs=post_kwargs), {'after': cursor}),
+            'group_posts': (reader, get, reverse(
+                'group_posts', kwargs={'slug': slug}), None),
+            'profile': (reader, get, reverse(
+                'profile', kwargs={'username': author}), None),
+            'post': (reader, get, reverse('post', kwargs=post_kwargs), None),
+            'post_edit': (self.author_client, get, reverse(
+                'post_edit', kwargs=post_kwargs), None),
+            'add_comment': (reader, 'post', reverse(
+                'add_comment', kwargs=post_kwargs), {'text': 'Еще один'}),
+            'post_comments': (reader, get, reverse(
+                'post_comments', kwargs=post_kwargs), {'after': cursor}),
+            'profile_follow': (reader, get, lambda: reverse(
+                'profile_follow',
+                kwargs={'username': next(to_follow).username}), None),
+            'profile_unfollow': (reader, get, lambda: reverse(
+                'profile_unfollow',
+                kwargs={'username': next(to_unfollow).username}), None),
+            'signup': (Client(), get, reverse('signup'), None),
+            'about:author': (Client(), get, reverse('about:author'), None),
+            'about:tech': (Client(), get, reverse('about:tech'), None),
+        }
+
+    def test_every_url_has_budget(self):
+        """У каждой страницы posts, users и about есть бюджет."""
+        names = url_names()
+        self.assertEqual(sorted(set(names) - set(BUDGETS)), [])
+        self.assertEqual(sorted(set(BUDGETS) - set(names)), [])
+        self.assertEqual(sorted(self.requests()), sorted(names))
+
+    def test_views_fit_budgets(self):
+        """Страницы с холодным кэшем укладываются в число запросов
+        и время из бюджета; при превышении выводятся все запросы.
+        """
+        for name, (client, method, url, data) in self.requests().items():
+            urls = url if callable(url) else lambda: url
+            # Первый запрос прогревает шаблоны и импорты.
+            getattr(client, method)(urls(), data)
+            cache.clear()
+            url = urls()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                elapsed = 1000 * (time.perf_counter() - started)
+            budget = budget_for(name)
+            with self.subTest(url_name=name):
+                self.assertLess(response.status_code, 400)
+                sql = '\n'.join(f'{number}. {query["sql"]}'
+                                for number, query in enumerate(queries, 1))
+                self.assertLessEqual(
+                    len(queries), budget.queries,
+                    f'{name}: {len(queries)} запросов при бюджете '
+                    f'{budget.queries}:\n{sql}')
+                self.assertLessEqual(
+                    elapsed, budget.milliseconds,
+                    f'{name}: {elapsed:.0f} мс при бюджете '
+                    f'{budget.milliseconds} мс; запросы:\n{sql}')
@@ -0,0 +1,284 @@
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..caching import bump, generation
+from ..templatetags.post_cards import card_key, prefetch_post_cards
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        FeedCacheTest.user = User.objects.create(username='test_user')
+        FeedCacheTest.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Описание тестовой группы'
+        )
+        FeedCacheTest.post = Post.objects.create(
+            text='Старый пост', author=FeedCacheTest.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(FeedCacheTest.user)
+
+    def test_generation_changes_only_on_bump(self):
+        """Поколение ленты меняется только при записи в нее."""
+        index = generation('index')
+        group = generation('group:1')
+        bump('index')
+        self.assertNotEqual(generation('index'), index)
+        self.assertEqual(generation('group:1'), group)
+
+    def test_generation_is_shared_between_processes(self):
+        """Поколение хранится не в кэше процесса: процесс со своим
+        пустым кэшем видит сдвиг, сделанный другим.
+        """
+        before = generation('index')
+        bump('index')
+        after = generation('index')
+        cache.clear()
+        self.assertEqual(generation('index'), after)
+        self.assertNotEqual(after, before)
+
+    def test_junk_parameters_reuse_fragment(self):
+        """Ключ фрагмента ленты - страница, а не адрес целиком:
+        посторонние параметры не плодят записи в кэше.
+        """
+        self.authorized_client.get(reverse('index'))
+        # bulk_create не вызывает сигналы и не сдвигает поколение.
+        Post.objects.bulk_create([Post(text='Тихий пост',
+                                       author=FeedCacheTest.user)])
+        response = self.authorized_client.get(reverse('index'),
+                                              {'junk': 'value'})
+        self.assertNotContains(response, 'Тихий пост')
+
+    def test_new_post_shows_up_immediately(self):
+        """Новый пост сразу виден на закэшированных лентах."""
+        urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'test-group'}),
+            reverse('profile', kwargs={'username': 'test_user'}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        self.authorized_client.post(
+            reverse('new_post'),
+            {'text': 'Свежий пост', 'group': FeedCacheTest.group.id})
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.authorized_client.get(url),
+                                    'Свежий пост')
+
+    def test_comment_invalidates_feed(self):
+        """Новый комментарий обновляет счетчик в закэшированной ленте."""
+        self.authorized_client.get(reverse('index'))
+        self.authorized_client.post(
+            reverse('add_comment', kwargs={
+                'username': 'test_user',
+                'post_id': FeedCacheTest.post.id}),
+            {'text': 'Комментарий'})
+        self.assertContains(self.authorized_client.get(reverse('index')),
+                            'Комментариев: 1')
+
+    def test_unrelated_write_keeps_cache(self):
+        """Запись в другую группу не сбрасывает кэш ленты группы."""
+        url = reverse('group_posts', kwargs={'slug': 'test-group'})
+        before = generation(f'group:{FeedCacheTest.group.id}')
+        self.authorized_client.get(url)
+        Post.objects.create(text='Пост без группы',
+                            author=FeedCacheTest.user)
+        self.assertEqual(
+            generation(f'group:{FeedCacheTest.group.id}'), before)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        PostCardCacheTest.user = User.objects.create(username='test_user')
+        PostCardCacheTest.user_2 = User.objects.create(username='user_2')
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}',
+                                author=PostCardCacheTest.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self):
+        return list(Post.objects.for_feed())
+
+    def test_cards_are_cached_per_version(self):
+        """Правка поста сбрасывает только его карточку."""
+        posts = self.feed()
+        prefetch_post_cards(posts)
+        edited = posts[0]
+        edited.text = 'Исправленный пост'
+        edited.save()
+        posts = self.feed()
+        self.assertIsNone(cache.get(card_key(posts[0])))
+        for post in posts[1:]:
+            self.assertIsNotNone(cache.get(card_key(post)))
+        prefetch_post_cards(posts)
+        self.assertIn('Исправленный пост', posts[0].card_html)
+
+    def test_comment_resets_card(self):
+        """Новый комментарий меняет версию поста."""
+        post = self.feed()[0]
+        post.comments.create(text='Комментарий',
+                             author=PostCardCacheTest.user_2)
+        self.assertEqual(Post.objects.get(pk=post.pk).version,
+                         post.version + 1)
+
+    def test_edit_after_comment_gets_new_version(self):
+        """Правка поста, загруженного до нового комментария, получает
+        свою версию, а не ту же, что у комментария.
+        """
+        post = Post.objects.get(pk=self.feed()[0].pk)
+        post.comments.create(text='Комментарий',
+                             author=PostCardCacheTest.user_2)
+        commented = Post.objects.get(pk=post.pk).version
+        post.text = 'Правка после комментария'
+        post.save()
+        self.assertEqual(post.version, commented + 1)
+        self.assertEqual(Post.objects.get(pk=post.pk).version, commented + 1)
+
+    def test_post_with_explicit_pk(self):
+        """Пост с заданным pk создается с начальной версией."""
+        post = Post.objects.create(pk=1000, text='Пост с номером',
+                                   author=PostCardCacheTest.user)
+        self.assertEqual(post.version, 0)
+        Post(pk=1001, text='Еще пост', author=PostCardCacheTest.user).save()
+        self.assertEqual(Post.objects.get(pk=1001).version, 0)
+
+    def test_post_fixture_loads(self):
+        """Фикстура поста загружается со своей версией, в том числе
+        поверх существующего поста.
+        """
+        post = self.feed()[0]
+        pk, version = post.pk, post.version
+        data = serializers.serialize('json', [post])
+        post.delete()
+        for _ in range(2):
+            for obj in serializers.deserialize('json', data):
+                obj.save()
+            self.assertEqual(Post.objects.get(pk=pk).version, version)
+
+    def test_edit_button_is_not_shared(self):
+        """Кнопка редактирования не попадает к другому читателю."""
+        author_client = Client()
+        author_client.force_login(PostCardCacheTest.user)
+        reader_client = Client()
+        reader_client.force_login(PostCardCacheTest.user_2)
+        self.assertContains(author_client.get(reverse('index')),
+                            'Редактировать')
+        self.assertNotContains(reader_client.get(reverse('index')),
+                               'Редактировать')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ConditionalGetTest.user = User.objects.create(username='test_user')
+        ConditionalGetTest.reader = User.objects.create(username='reader')
+        ConditionalGetTest.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Описание тестовой группы'
+        )
+        ConditionalGetTest.post = Post.objects.create(
+            text='Пост', author=ConditionalGetTest.user,
+            group=ConditionalGetTest.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ConditionalGetTest.reader)
+        post = ConditionalGetTest.post
+        self.urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'test-group'}),
+            reverse('profile', kwargs={'username': 'test_user'}),
+            reverse('post', kwargs={'username': 'test_user',
+                                    'post_id': post.id}),
+        )
+
+    def assertNotModified(self, client, url, response, modified=False):
+        again = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 200 if modified else 304)
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменившиеся страницы отдаются ответом 304 по ETag
+        и по Last-Modified.
+        """
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotModified(self.guest_client, url, response)
+                again = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(again.status_code, 304)
+
+    def test_validator_skips_rendering(self):
+        """Ответ 304 не рендерит страницу."""
+        response = self.guest_client.get(self.urls[0])
+        with self.assertTemplateNotUsed('index.html'):
+            self.assertNotModified(self.guest_client, self.urls[0], response)
+
+    def test_comment_changes_validator(self):
+        """Новый комментарий меняет валидатор ленты и страницы поста."""
+        responses = [self.guest_client.get(url) for url in self.urls]
+        ConditionalGetTest.post.comments.create(
+            text='Комментарий', author=ConditionalGetTest.reader)
+        for url, response in zip(self.urls, responses):
+            with self.subTest(url=url):
+                self.assertNotModified(self.guest_client, url, response,
+                                       modified=True)
+
+    def test_write_in_another_worker_changes_validator(self):
+        """Запись, обработанная другим процессом со своим кэшем, тоже
+        меняет валидатор: старая копия не получает 304.
+        """
+        response = self.guest_client.get(self.urls[0])
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'other-worker'}}):
+            Post.objects.create(text='Пост из другого процесса',
+                                author=ConditionalGetTest.user)
+        self.assertNotModified(self.guest_client, self.urls[0], response,
+                               modified=True)
+
+    def test_follow_changes_profile_validator(self):
+        """Подписка меняет валидатор страницы автора."""
+        url = self.urls[2]
+        response = self.reader_client.get(url)
+        ConditionalGetTest.reader.follower.create(
+            author=ConditionalGetTest.user)
+        self.assertNotModified(self.reader_client, url, response,
+                               modified=True)
+
+    def test_viewers_are_separated(self):
+        """Копия страницы гостя не подходит пользователю, и наоборот;
+        страница пользователя не кэшируется прокси.
+        """
+        for url in self.urls:
+            with self.subTest(url=url):
+                guest = self.guest_client.get(url)
+                reader = self.reader_client.get(url)
+                self.assertNotEqual(guest['ETag'], reader['ETag'])
+                self.assertNotModified(self.reader_client, url, guest,
+                                       modified=True)
+                self.assertNotModified(self.guest_client, url, reader,
+                                       modified=True)
+                self.assertIn('private', reader['Cache-Control'])
+                self.assertNotIn('private', guest['Cache-Control'])
+                self.assertIn('Cookie', reader['Vary'])
@@ -0,0 +1,109 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..caching import generation
+from ..models import (Comment, Follow, Group, GroupCounter, Post,
+                      TimelineEntry, UserCounter)
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        CountersTest.author = User.objects.create(username='author')
+        CountersTest.reader = User.objects.create(username='reader')
+        CountersTest.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Описание тестовой группы'
+        )
+        CountersTest.group_2 = Group.objects.create(
+            title='Вторая группа',
+            slug='another-group',
+            description='Описание второй группы'
+        )
+
+    def setUp(self):
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=CountersTest.author,
+                                        group=CountersTest.group)
+
+    def assertCounters(self, user, **expected):
+        counter = UserCounter.for_user(user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(counter, field), value)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счетчики."""
+        self.assertCounters(CountersTest.author, posts=1)
+        self.assertEqual(GroupCounter.for_group(CountersTest.group).posts, 1)
+        self.post.group = CountersTest.group_2
+        self.post.save()
+        self.assertEqual(GroupCounter.for_group(CountersTest.group).posts, 0)
+        self.assertEqual(
+            GroupCounter.for_group(CountersTest.group_2).posts, 1)
+        self.post.delete()
+        self.assertCounters(CountersTest.author, posts=0)
+        self.assertEqual(
+            GroupCounter.for_group(CountersTest.group_2).posts, 0)
+
+    def test_author_change_moves_post(self):
+        """Смена автора переносит счетчик записей, ленты подписок
+        и сбрасывает ленты обоих авторов.
+        """
+        new_author = User.objects.create(username='new_author')
+        Follow.objects.create(user=CountersTest.reader,
+                              author=CountersTest.author)
+        fan = User.objects.create(username='fan')
+        Follow.objects.create(user=fan, author=new_author)
+        old_feed = generation(f'author:{CountersTest.author.pk}')
+        self.post.author = new_author
+        self.post.save()
+        self.assertCounters(CountersTest.author, posts=0)
+        self.assertCounters(new_author, posts=1)
+        self.assertCounters(CountersTest.reader, inbox=0)
+        self.assertCounters(fan, inbox=1)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(post=self.post)
+                 .values_list('user_id', 'author_id')),
+            [(fan.pk, new_author.pk)])
+        self.assertNotEqual(generation(f'author:{CountersTest.author.pk}'),
+                            old_feed)
+
+    def test_follow_and_comment_counters(self):
+        """Подписка и комментарий меняют счетчики обоих пользователей."""
+        follow = Follow.objects.create(user=CountersTest.reader,
+                                       author=CountersTest.author)
+        Comment.objects.create(post=self.post, author=CountersTest.reader,
+                               text='Комментарий')
+        self.assertCounters(CountersTest.author, followers=1, following=0)
+        self.assertCounters(CountersTest.reader, following=1, comments=1)
+        follow.delete()
+        self.assertCounters(CountersTest.author, followers=0)
+        self.assertCounters(CountersTest.reader, following=0)
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters восстанавливает счетчики."""
+        Follow.objects.create(user=CountersTest.reader,
+                              author=CountersTest.author)
+        UserCounter.objects.all().update(posts=100, followers=100)
+        GroupCounter.objects.all().delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertCounters(CountersTest.author, posts=1, followers=1)
+        self.assertEqual(GroupCounter.for_group(CountersTest.group).posts, 1)
+
+    def test_profile_reads_counters(self):
+        """Профиль берет числа из счетчиков, а не из COUNT(*)."""
+        UserCounter.objects.filter(user=CountersTest.author).update(
+            posts=42, followers=7)
+        response = Client().get(
+            reverse('profile', kwargs={'username': 'author'}))
+        self.assertEqual(response.context['count'], 42)
+        self.assertContains(response, 'Подписчиков: 7')
@@ -0,0 +1,168 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, UserCounter
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        TimelineTest.author = User.objects.create(username='author')
+        TimelineTest.reader = User.objects.create(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(TimelineTest.reader)
+
+    def create_posts(self, count):
+        return [Post.objects.create(text=f'Пост {i}',
+                                    author=TimelineTest.author)
+                for i in range(count)]
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(user=TimelineTest.reader)
+                    .values_list('post_id', flat=True))
+
+    def test_new_post_is_delivered_to_followers(self):
+        """Новый пост попадает в ленту подписчика."""
+        Follow.objects.create(user=TimelineTest.reader,
+                              author=TimelineTest.author)
+        post, = self.create_posts(1)
+        self.assertEqual(self.timeline(), [post.id])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет старые посты автора, отписка убирает их."""
+        self.create_posts(3)
+        self.reader_client.get(
+            reverse('profile_follow', kwargs={'username': 'author'}))
+        self.assertEqual(len(self.timeline()), 3)
+        self.reader_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'author'}))
+        self.assertEqual(self.timeline(), [])
+
+    @override_settings(FEED_INBOX_LIMIT=10)
+    def test_inbox_is_capped(self):
+        """Лента не растет больше FEED_INBOX_LIMIT с запасом."""
+        Follow.objects.create(user=TimelineTest.reader,
+                              author=TimelineTest.author)
+        posts = self.create_posts(25)
+        timeline = self.timeline()
+        self.assertLessEqual(len(timeline), 11)
+        self.assertIn(posts[-1].id, timeline)
+
+    def test_follow_page_reads_timeline(self):
+        """Страница подписок выдается из ленты в порядке публикации."""
+        Follow.objects.create(user=TimelineTest.reader,
+                              author=TimelineTest.author)
+        posts = self.create_posts(12)
+        page = self.reader_client.get(reverse('follow_index')).context['page']
+        self.assertEqual([post.id for post in page],
+                         [post.id for post in reversed(posts)][:10])
+        self.assertTrue(page.has_next())
+
+
+class HybridFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        HybridFeedTest.star = User.objects.create(username='star')
+        HybridFeedTest.author = User.objects.create(username='author')
+        HybridFeedTest.reader = User.objects.create(username='reader')
+        HybridFeedTest.fan = User.objects.create(username='fan')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(HybridFeedTest.reader)
+
+    @override_settings(FEED_PULL_THRESHOLD=2)
+    def test_popular_author_is_pulled_and_merged(self):
+        """Посты популярного автора не раскладываются по лентам,
+        а подмешиваются в ленту при чтении в порядке публикации.
+        """
+        for author in (HybridFeedTest.star, HybridFeedTest.author):
+            Follow.objects.create(user=HybridFeedTest.reader, author=author)
+        Follow.objects.create(user=HybridFeedTest.fan,
+                              author=HybridFeedTest.star)
+        posts = [
+            Post.objects.create(text=f'Пост {i}',
+                                author=(HybridFeedTest.star if i % 2
+                                        else HybridFeedTest.author))
+            for i in range(14)
+        ]
+        pushed = TimelineEntry.objects.filter(user=HybridFeedTest.reader)
+        self.assertFalse(pushed.filter(author=HybridFeedTest.star).exists())
+        expected = [post.id for post in reversed(posts)]
+        page = self.reader_client.get(reverse('follow_index')).context['page']
+        self.assertEqual([post.id for post in page], expected[:10])
+        page = self.reader_client.get(
+            reverse('follow_index') + f'?after={page.next_cursor}'
+        ).context['page']
+        self.assertEqual([post.id for post in page], expected[10:])
+
+    def follow_page(self):
+        page = self.reader_client.get(reverse('follow_index')).context['page']
+        return [item.id for item in page]
+
+    @override_settings(FEED_PULL_THRESHOLD=2, FEED_PUSH_THRESHOLD=2)
+    def test_posts_stay_when_author_stops_being_popular(self):
+        """Когда у автора становится меньше подписчиков, чем порог,
+        его посты читаются при показе ленты, пока push_feeds не разложит
+        их по лентам.
+        """
+        star = HybridFeedTest.star
+        Follow.objects.create(user=HybridFeedTest.reader, author=star)
+        Follow.objects.create(user=HybridFeedTest.fan, author=star)
+        post = Post.objects.create(text='Пост звезды', author=star)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        Follow.objects.filter(user=HybridFeedTest.fan).delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_page(), [post.id])
+        call_command('push_feeds', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=HybridFeedTest.reader, post=post).exists())
+        self.assertFalse(UserCounter.objects.get(pk=star.pk).pulled)
+        self.assertEqual(self.follow_page(), [post.id])
+        self.assertEqual(
+            UserCounter.objects.get(pk=HybridFeedTest.reader.pk).inbox, 1)
+        newer = Post.objects.create(text='Новый пост', author=star)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=HybridFeedTest.reader, post=newer).exists())
+
+    @override_settings(FEED_PULL_THRESHOLD=3, FEED_PUSH_THRESHOLD=2)
+    def test_push_waits_below_push_threshold(self):
+        """Автор на границе порога остается читаемым при показе ленты,
+        пока подписчиков не станет меньше FEED_PUSH_THRESHOLD.
+        """
+        star = HybridFeedTest.star
+        other = User.objects.create(username='other')
+        for user in (HybridFeedTest.reader, HybridFeedTest.fan, other):
+            Follow.objects.create(user=user, author=star)
+        post = Post.objects.create(text='Пост звезды', author=star)
+        Follow.objects.filter(user=other).delete()
+        call_command('push_feeds', stdout=StringIO())
+        self.assertTrue(UserCounter.objects.get(pk=star.pk).pulled)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_page(), [post.id])
+        Follow.objects.filter(user=HybridFeedTest.fan).delete()
+        call_command('push_feeds', stdout=StringIO())
+        self.assertFalse(UserCounter.objects.get(pk=star.pk).pulled)
+        self.assertEqual(list(TimelineEntry.objects.filter(post=post)
+                              .values_list('user_id', flat=True)),
+                         [HybridFeedTest.reader.pk])
+
+    def test_bench_feed_command(self):
+        """Бенчмарк лент отрабатывает и не оставляет данных."""
+        users = User.objects.count()
+        out = StringIO()
+        call_command('bench_feed', users=20, follows=3, posts=5, reads=5,
+                     threshold=3, stdout=out)
+        for strategy in ('pull', 'push', 'hybrid'):
+            self.assertIn(strategy, out.getvalue())
+        self.assertEqual(User.objects.count(), users)
@@ -5,10 +5,12 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls.base import reverse
 
+from ..forms import PostForm
 from ..models import Comment, Group, Post
+from ..uploads import StreamingUploadHandler
 
 User = get_user_model()
 
@@ -51,6 +53,9 @@ class PostCreateFormTest(TestCase):
         )
         uploaded = SimpleUploadedFile(
             name='small.gif', content=small_gif, content_type='image/gif')
+        # Картинки хранятся под именем по хэшу содержимого.
+        self.image_name = Post._meta.get_field('image').storage.hashed_name(
+            'posts/small.gif', uploaded)
         self.post_form_data = {
             'text': 'Новая запись',
             'group': PostCreateFormTest.group.id,
@@ -81,7 +86,7 @@ class PostCreateFormTest(TestCase):
         self.assertEqual(response.text, self.post_form_data['text'])
         self.assertEqual(response.author, PostCreateFormTest.user)
         self.assertEqual(response.group, PostCreateFormTest.group)
-        self.assertEqual(response.image, 'posts/small.gif')
+        self.assertEqual(response.image, self.image_name)
 
     def test_edit_post(self):
         """ При редактировании не создается еще одна запись в БД и работает редирект.
@@ -108,7 +113,7 @@ class PostCreateFormTest(TestCase):
         self.assertEqual(response.text, self.post_form_data['text'])
         self.assertEqual(response.author, PostCreateFormTest.user)
         self.assertEqual(response.group, PostCreateFormTest.group)
-        self.assertEqual(response.image, 'posts/small.gif')
+        self.assertEqual(response.image, self.image_name)
 
     def test_add_comment(self):
         """Создается комментарий, работает редирект."""
@@ -137,3 +142,89 @@ class PostCreateFormTest(TestCase):
                          self.comment_form_data['author'])
         self.assertEqual(response.context['comments'][0].post,
                          self.comment_form_data['post'])
+
+
+class PostImageLimitsTest(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        PostImageLimitsTest.user = User.objects.create(username='test_user')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(PostImageLimitsTest.user)
+
+    def image_errors(self, content, name='small.gif'):
+        form = PostForm({'text': 'Текст'}, files={
+            'image': SimpleUploadedFile(name=name, content=content)})
+        self.assertFalse(form.is_valid())
+        return [error.code for error in form.errors.as_data()['image']]
+
+    @override_settings(POST_IMAGE_MAX_BYTES=16)
+    def test_file_size_limit(self):
+        """Файл больше POST_IMAGE_MAX_BYTES отклоняется формой."""
+        self.assertEqual(self.image_errors(self.small_gif),
+                         ['file_too_large'])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_pixel_limit(self):
+        """Картинка больше POST_IMAGE_MAX_PIXELS отклоняется
+        по заголовку.
+        """
+        self.assertEqual(self.image_errors(self.small_gif),
+                         ['too_many_pixels'])
+
+    def test_not_an_image(self):
+        """Файл без заголовка картинки отклоняется."""
+        self.assertEqual(self.image_errors(b'text', name='text.gif'),
+                         ['invalid_image'])
+
+    @override_settings(POST_IMAGE_MAX_BYTES=16)
+    def test_upload_is_not_stored_over_limit(self):
+        """Загрузка пишется на диск не дальше лимита и не создает пост."""
+        handler = StreamingUploadHandler()
+        handler.new_file('image', 'small.gif', 'image/gif',
+                         len(self.small_gif))
+        for start in range(0, len(self.small_gif), 8):
+            handler.receive_data_chunk(self.small_gif[start:start + 8],
+                                       start)
+        upload = handler.file_complete(len(self.small_gif))
+        self.assertEqual(upload.size, len(self.small_gif))
+        with open(upload.temporary_file_path(), 'rb') as stored:
+            self.assertEqual(stored.read(), self.small_gif[:16])
+        upload.close()
+        post_count = Post.objects.count()
+        response = self.authorized_client.post(reverse('new_post'), {
+            'text': 'Текст',
+            'image': SimpleUploadedFile(name='small.gif',
+                                        content=self.small_gif)})
+        self.assertEqual(Post.objects.count(), post_count)
+        errors = response.context['form'].errors.as_data()['image']
+        self.assertEqual(errors[0].code, 'file_too_large')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=16)
+    def test_admin_checks_image_limits(self):
+        """Админка отклоняет картинку больше лимита, как и форма сайта."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        post_count = Post.objects.count()
+        response = client.post(reverse('admin:posts_post_add'), {
+            'text': 'Текст',
+            'author': PostImageLimitsTest.user.pk,
+            'image': SimpleUploadedFile(name='small.gif',
+                                        content=self.small_gif)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Post.objects.count(), post_count)
+        errors = response.context['adminform'].form.errors.as_data()['image']
+        self.assertEqual(errors[0].code, 'file_too_large')
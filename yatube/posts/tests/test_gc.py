@@ -0,0 +1,116 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import default
+
+from .. import thumbnails
+from ..gc import Collector
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaCollectorTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        cache.clear()
+        default.kvstore.reset()
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create(username='test_user'),
+            image=SimpleUploadedFile(name='live.gif', content=SMALL_GIF))
+        thumbnails.generate(
+            (self.post.image.name,
+             tuple((geometry, tuple(sorted(options.items())))
+                   for geometry, options in thumbnails.variants(self.post))),
+            self.post.image.storage)
+        self.storage = self.post.image.storage
+        self.orphan = self.storage.save(
+            'posts/orphan.gif', ContentFile(SMALL_GIF + b'orphan'))
+        self.orphan_thumbnail = default.storage.save(
+            'cache/00/00/orphan.jpg', ContentFile(b'thumbnail'))
+
+    def live_thumbnails_exist(self):
+        backend = thumbnails.BackgroundThumbnailBackend()
+        return all(
+            backend.lookup(self.post.image, geometry, options).exists()
+            for geometry, options in thumbnails.variants(self.post))
+
+    def test_dry_run_only_reports(self):
+        """dry run считает файлы без ссылок, но не удаляет их."""
+        report = Collector(pause=0, min_age=0, dry_run=True).run()
+        self.assertEqual(report['originals'],
+                         {'files': 1, 'bytes': len(SMALL_GIF) + 6})
+        self.assertEqual(report['thumbnails'],
+                         {'files': 1, 'bytes': len('thumbnail')})
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.assertTrue(default.storage.exists(self.orphan_thumbnail))
+
+    def test_orphans_are_deleted(self):
+        """Удаляются только файлы без ссылок, пачками."""
+        Collector(batch_size=1, pause=0, min_age=0).run()
+        self.assertFalse(self.storage.exists(self.orphan))
+        self.assertFalse(default.storage.exists(self.orphan_thumbnail))
+        self.assertTrue(self.storage.exists(self.post.image.name))
+        self.assertTrue(self.live_thumbnails_exist())
+
+    def test_fresh_files_are_kept(self):
+        """Только что записанные файлы сборщик не трогает."""
+        report = Collector(pause=0, min_age=3600).run()
+        self.assertEqual(report['originals']['files'], 0)
+        self.assertTrue(self.storage.exists(self.orphan))
+
+    def test_thumbnails_of_deleted_post_are_collected(self):
+        """Миниатюры удаленного поста удаляются вместе с картинкой."""
+        variants = len(thumbnails.variants(self.post))
+        Post.objects.filter(pk=self.post.pk).delete()
+        report = Collector(pause=0, min_age=0).run()
+        self.assertEqual(report['originals']['files'], 2)
+        self.assertEqual(report['thumbnails']['files'], variants + 1)
+
+    def test_thumbnails_are_checked_per_batch(self):
+        """Миниатюры проверяются по KVStore пачками, без выгрузки
+        вариантов всех постов.
+        """
+        collector = Collector(batch_size=2, pause=0, min_age=0)
+        with CaptureQueriesContext(connection) as queries:
+            collector.sweep_thumbnails()
+        self.assertFalse(any(Post._meta.db_table in query['sql']
+                             for query in queries))
+        self.assertEqual(collector.report['thumbnails']['files'], 1)
+        self.assertTrue(self.live_thumbnails_exist())
+
+    def test_collect_media_command(self):
+        """Команда печатает отчет об освобожденных байтах."""
+        out = StringIO()
+        call_command('collect_media', '--pause=0', '--min-age=0',
+                     stdout=out)
+        self.assertIn(f'Освобождено байт: {len(SMALL_GIF) + 15}',
+                      out.getvalue())
@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_METRICS_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def observe_after_stale_file():
+    # Файл с тем же PID остался от завершившегося процесса.
+    metrics._write(metrics._path(os.getpid()), {
+        ('yatube_responses_total', (('view', 'index'), ('status', '200'))):
+            5})
+    metrics.observe('index', 200, 0.02)
+    metrics.flush()
+
+
+def observe_in_child(flushed, done):
+    metrics.observe('index', 200, 0.02, queries=3, hits=1, misses=2)
+    metrics.flush()
+    flushed.set()
+    done.wait()
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR, METRICS_FLUSH_INTERVAL=0,
+                   PROFILING_ENABLED=True, PROFILING_LOG_SAMPLE_RATE=0)
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create(username='author')
+        Post.objects.create(text='Текст поста', author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+
+    def sample(self, name, **labels):
+        return metrics.collect()[(name, tuple(labels.items()))]
+
+    def test_requests_are_counted_per_url_name(self):
+        """Ответы, SQL-запросы и время считаются по имени URL."""
+        responses = self.sample('yatube_responses_total',
+                                view='index', status='200')
+        queries = self.sample('yatube_db_queries_total', view='index')
+        count = self.sample('yatube_request_duration_seconds_count',
+                            view='index')
+        self.client.get(reverse('index'))
+        self.assertEqual(self.sample('yatube_responses_total',
+                                     view='index', status='200'),
+                         responses + 1)
+        self.assertGreater(
+            self.sample('yatube_db_queries_total', view='index'), queries)
+        self.assertEqual(self.sample('yatube_request_duration_seconds_count',
+                                     view='index'), count + 1)
+        self.client.get('/unknown/page/')
+        self.assertGreater(self.sample('yatube_responses_total',
+                                       view='unresolved', status='404'), 0)
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.client.get(reverse('about:tech'))
+        samples = metrics.collect()
+        buckets = [samples[('yatube_request_duration_seconds_bucket',
+                            (('view', 'about:tech'), ('le', str(bound))))]
+                   for bound in metrics.BUCKETS]
+        inf = self.sample('yatube_request_duration_seconds_bucket',
+                          view='about:tech', le='+Inf')
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertLessEqual(buckets[-1], inf)
+        self.assertEqual(inf, self.sample(
+            'yatube_request_duration_seconds_count', view='about:tech'))
+
+    def test_export_in_prometheus_format(self):
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        self.assertIn('# TYPE yatube_responses_total counter', text)
+        self.assertRegex(text, r'\nyatube_request_duration_seconds_bucket'
+                               r'\{view="index",le="0.005"\} \d+\n')
+        self.assertRegex(text, r'\nyatube_responses_total'
+                               r'\{view="index",status="200"\} \d+\n')
+        self.assertRegex(text, r'\nyatube_cache_hits_total'
+                               r'\{view="index"\} \d+\n')
+
+    def test_export_is_internal_only(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+
+    def test_private_networks_are_not_allowed_by_default(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 403)
+
+    def test_client_address_behind_proxy(self):
+        """За доверенным прокси проверяется адрес из X-Forwarded-For,
+        а подделанное начало цепочки не учитывается.
+        """
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_X_FORWARDED_FOR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            reverse('metrics'),
+            HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='203.0.113.5',
+                                   HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_export_by_token(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='203.0.113.5',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='203.0.113.5',
+                                   HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_counts_are_summed_across_processes(self):
+        """Счетчики другого процесса попадают в общую сумму, а счетчики
+        родителя не переходят в процесс, порожденный fork. Файл
+        завершившегося процесса сливается в архив, сумма не меняется.
+        """
+        self.client.get(reverse('index'))
+        metrics.flush()
+        before = self.sample('yatube_responses_total',
+                             view='index', status='200')
+        context = multiprocessing.get_context('fork')
+        flushed, done = context.Event(), context.Event()
+        child = context.Process(target=observe_in_child,
+                                args=(flushed, done))
+        child.start()
+        try:
+            self.assertTrue(flushed.wait(10))
+            self.assertEqual(self.sample('yatube_responses_total',
+                                         view='index', status='200'),
+                             before + 1)
+        finally:
+            done.set()
+            child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(self.sample('yatube_responses_total',
+                                     view='index', status='200'),
+                         before + 1)
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_METRICS_DIR, f'{child.pid}.json')))
+        self.assertTrue(os.path.exists(
+            os.path.join(TEMP_METRICS_DIR, metrics.ARCHIVE)))
+        self.assertEqual(self.sample('yatube_responses_total',
+                                     view='index', status='200'),
+                         before + 1)
+
+    def test_reused_pid_keeps_old_counts(self):
+        """Счетчики прежнего процесса с тем же PID не затираются."""
+        metrics.flush()
+        before = self.sample('yatube_responses_total',
+                             view='index', status='200')
+        child = multiprocessing.get_context('fork').Process(
+            target=observe_after_stale_file)
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(self.sample('yatube_responses_total',
+                                     view='index', status='200'),
+                         before + 6)
@@ -1,10 +1,21 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
 
-from ..models import Group, Post
+from ..models import Group, MediaFile, Post
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -87,3 +98,90 @@ class GroupModelTest(TestCase):
         group = GroupModelTest.group_2
         expected_object_name = group.title
         self.assertEqual(expected_object_name, str(group))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=100)
+class PostImageNormalizeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        PostImageNormalizeTest.user = User.objects.create(
+            username='test_user'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @staticmethod
+    def photo(size=(300, 150)):
+        """JPEG с EXIF, как с камеры."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(
+            buffer, 'JPEG', quality=100, exif=exif)
+        return buffer.getvalue()
+
+    def test_upload_is_normalized(self):
+        """Новая картинка уменьшается, теряет EXIF и лог пишет
+        сэкономленные байты.
+        """
+        content = self.photo()
+        with self.assertLogs('posts.uploads', 'INFO') as logs:
+            post = Post.objects.create(
+                text='Фото', author=PostImageNormalizeTest.user,
+                image=SimpleUploadedFile(name='photo.jpg', content=content))
+        self.assertIn('сэкономлено', logs.output[0])
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn('exif', image.info)
+        self.assertLess(post.image.size, len(content))
+
+    def test_placeholder_is_stored(self):
+        """При сохранении картинки запоминается крошечная заглушка."""
+        post = Post.objects.create(
+            text='Фото', author=PostImageNormalizeTest.user,
+            image=SimpleUploadedFile(name='photo.jpg', content=self.photo()))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(post.image_placeholder), 1000)
+        post.image = None
+        post.save()
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_gif_is_kept(self):
+        """GIF сохраняется без перекодирования."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        post = Post.objects.create(
+            text='GIF', author=PostImageNormalizeTest.user,
+            image=SimpleUploadedFile(name='small.gif', content=small_gif))
+        with open(post.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), small_gif)
+
+    def test_normalize_images_command(self):
+        """Команда нормализует уже загруженные картинки."""
+        storage = Post._meta.get_field('image').storage
+        name = storage.save('posts/old.jpg', ContentFile(self.photo()))
+        post = Post.objects.create(
+            text='Старое фото', author=PostImageNormalizeTest.user,
+            image=name)
+        out = StringIO()
+        call_command('normalize_images', stdout=out)
+        self.assertIn('Нормализовано картинок: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, name)
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 0)
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
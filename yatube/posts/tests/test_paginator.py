@@ -0,0 +1,83 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..paginator import CursorPaginator, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        CursorPaginatorTest.user = User.objects.create(username='test_user')
+        CursorPaginatorTest.posts = [
+            Post.objects.create(text=f'Пост {i}',
+                                author=CursorPaginatorTest.user)
+            for i in range(25)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_roundtrip(self):
+        """Токен курсора декодируется в исходные значения."""
+        token = encode_cursor(['2021-07-05 13:43:00+00:00', 7])
+        self.assertEqual(decode_cursor(token),
+                         ['2021-07-05 13:43:00+00:00', '7'])
+        self.assertIsNone(decode_cursor('не-токен'))
+
+    def test_pages_follow_each_other(self):
+        """Переход по after/before проходит все посты без пропусков."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        third = paginator.get_page(after=second.next_cursor)
+        ids = [post.id for page in (first, second, third) for post in page]
+        expected = list(Post.objects.values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertFalse(first.has_previous())
+        self.assertTrue(second.has_next())
+        self.assertFalse(third.has_next())
+        back = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_legacy_page_number(self):
+        """Старые ссылки ?page=N продолжают работать."""
+        response = self.guest_client.get(reverse('index') + '?page=3')
+        self.assertEqual(len(response.context['page']), 5)
+        self.assertEqual(response.context['page'].number, 3)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор не ломает страницу, а выдает первую страницу."""
+        response = self.guest_client.get(reverse('index') + '?after=xyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_forged_cursor_shows_first_page(self):
+        """Токен с не-строками или неподходящими значениями не роняет
+        ленты и API.
+        """
+        forged = ([{'a': 1}, 1], [None, None], [[], []], ['', ''],
+                  ['2020-01-01', 'x'])
+        for values in forged:
+            token = base64.urlsafe_b64encode(
+                json.dumps(values).encode()).decode()
+            for url in (reverse('index'), reverse('api_index')):
+                with self.subTest(values=values, url=url):
+                    response = self.guest_client.get(url, {'after': token})
+                    self.assertEqual(response.status_code, 200)
+
+    def test_no_count_query(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        with self.assertNumQueries(1) as queries:
+            list(CursorPaginator(Post.objects.all(), 10).get_page())
+        self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
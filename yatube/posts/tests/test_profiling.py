@@ -0,0 +1,97 @@
+import json
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+
+User = get_user_model()
+
+
+def server_timing(response):
+    """Метрики заголовка Server-Timing: имя -> (dur, desc)."""
+    metrics = {}
+    for metric in response['Server-Timing'].split(', '):
+        name, *params = metric.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(params['dur']), params.get('desc', ''))
+    return metrics
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_LOG_SAMPLE_RATE=0)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create(username='author')
+        Post.objects.create(text='Текст поста', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_server_timing_counts_queries(self):
+        """Число SQL-запросов в Server-Timing совпадает с выполненными."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+        metrics = server_timing(response)
+        self.assertEqual(set(metrics), {'sql', 'template', 'cache', 'total'})
+        self.assertEqual(metrics['sql'][1], f'"{len(queries)} queries"')
+        self.assertGreater(metrics['template'][0], 0)
+        self.assertGreaterEqual(metrics['total'][0], metrics['sql'][0])
+
+    def test_server_timing_counts_cache_hits(self):
+        """Повторный запрос страницы читает ее части из кэша."""
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('index'))
+        hits, misses = map(int, re.findall(
+            r'\d+', server_timing(response)['cache'][1]))
+        self.assertGreater(hits, 0)
+
+    def test_no_template_time_without_templates(self):
+        response = self.client.get(reverse('api_index'))
+        self.assertEqual(server_timing(response)['template'][0], 0)
+
+    @override_settings(PROFILING_LOG_SAMPLE_RATE=1)
+    def test_sampled_requests_are_logged(self):
+        """Замеры пишутся в журнал одной JSON-строкой."""
+        with self.assertLogs('posts.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['url_name'], 'index')
+        self.assertEqual(record['status'], response.status_code)
+        self.assertEqual(logs.records[0].profile, record)
+        for key in ('total_ms', 'sql_count', 'sql_ms', 'template_ms',
+                    'cache_hits', 'cache_misses'):
+            self.assertIn(key, record)
+
+    def test_unsampled_requests_are_not_logged(self):
+        with self.assertNoLogs('posts.profiling', 'INFO'):
+            self.client.get(reverse('index'))
+
+    @override_settings(PROFILING_LOG_SAMPLE_RATE=1)
+    def test_public_requests_get_no_header(self):
+        """Снаружи заголовок не отдается, но замеры пишутся в журнал."""
+        with self.assertLogs('posts.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('index'),
+                                       REMOTE_ADDR='203.0.113.5')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(len(logs.records), 1)
+
+    def test_staff_gets_header_from_outside(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('index'),
+                                   REMOTE_ADDR='203.0.113.5')
+        self.assertTrue(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        """Выключенное профилирование не добавляет заголовок."""
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,110 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+# Строки EXPLAIN QUERY PLAN, которых в запросах страниц быть не должно:
+# чтение таблицы целиком (SCAN без индекса) и сортировка во временном
+# B-дереве вместо чтения индекса по порядку.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+TEMP_B_TREE = re.compile(r'USE TEMP B-TREE')
+# Результаты полнотекстового поиска сортируются по релевантности,
+# которую не положить в индекс: для них временная сортировка допустима.
+FTS_TABLE = re.compile(r'VIRTUAL TABLE')
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц идут по индексам.
+
+    Каждая страница открывается на небольшой базе, и для каждого ее
+    SELECT проверяется план SQLite.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        authors = [User.objects.create(username=f'author_{number}')
+                   for number in range(3)]
+        QueryPlanTest.reader = User.objects.create(username='reader')
+        groups = [Group.objects.create(title=f'Группа {number}',
+                                       slug=f'group-{number}',
+                                       description='Описание')
+                  for number in range(2)]
+        for number in range(30):
+            post = Post.objects.create(text=f'Пост номер {number}',
+                                       author=authors[number % 3],
+                                       group=groups[number % 2])
+            post.comments.create(text='Комментарий',
+                                 author=QueryPlanTest.reader)
+        QueryPlanTest.post = post
+        for author in authors[:2]:
+            Follow.objects.create(user=QueryPlanTest.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(QueryPlanTest.reader)
+
+    def urls(self):
+        post = QueryPlanTest.post
+        post_kwargs = {'username': post.author.username, 'post_id': post.id}
+        return (
+            reverse('index'),
+            reverse('index') + '?page=2',
+            reverse('group_posts', kwargs={'slug': 'group-0'}),
+            reverse('profile', kwargs={'username': 'author_0'}),
+            reverse('post', kwargs=post_kwargs),
+            reverse('post_comments', kwargs=post_kwargs),
+            reverse('follow_index'),
+            reverse('search') + '?q=номер',
+            reverse('api_index'),
+            reverse('api_group_posts', kwargs={'slug': 'group-0'}),
+            reverse('api_profile', kwargs={'username': 'author_0'}),
+            reverse('api_post', kwargs=post_kwargs),
+            reverse('api_follow_index'),
+        )
+
+    def next_page(self, url):
+        """Вторая страница ленты по курсору."""
+        response = self.client.get(url)
+        page = response.context['page'] if response.context else None
+        if page is None or not page.next_cursor:
+            return None
+        return f'{url.split("?")[0]}?after={page.next_cursor}'
+
+    def test_no_full_scans_or_temp_sorts(self):
+        """Ни один запрос страниц не читает таблицу целиком и не
+        сортирует во временном B-дереве.
+        """
+        urls = list(self.urls())
+        urls += [url for url in map(self.next_page, urls[:4]) if url]
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                plan = query_plan(sql)
+                sorts_allowed = any(map(FTS_TABLE.search, plan))
+                bad = [line for line in plan
+                       if FULL_SCAN.match(line)
+                       or TEMP_B_TREE.search(line) and not sorts_allowed]
+                with self.subTest(url=url, sql=sql):
+                    self.assertFalse(bad, '\n'.join([sql, *plan]))
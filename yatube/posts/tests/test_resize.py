@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from PIL import Image
+
+from .. import resize
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_png(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ResizeEndpointTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ResizeEndpointTest.user = User.objects.create_user(username='auth')
+        ResizeEndpointTest.post = Post.objects.create(
+            text='Тестовый текст',
+            author=ResizeEndpointTest.user,
+            image=SimpleUploadedFile('big.png', make_png(200, 100),
+                                     content_type='image/png')
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        shutil.rmtree(f'{TEMP_MEDIA_ROOT}/{resize.CACHE_DIR}',
+                      ignore_errors=True)
+        self.client = Client()
+        self.name = ResizeEndpointTest.post.image.name
+
+    def test_resized_image_is_served(self):
+        """Картинка уменьшается до заданного размера и кэшируется
+        браузером надолго.
+        """
+        response = self.client.get(resize.url(self.name, 50, 40))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as im:
+            self.assertEqual(im.size, (50, 40))
+
+    def test_bad_signature_is_forbidden(self):
+        """Ссылка с чужой подписью или без нее отклоняется."""
+        url = resize.url(self.name, 50, 40)
+        for bad_url in (url.replace('50x40', '60x40'), url.split('?')[0]):
+            with self.subTest(url=bad_url):
+                response = self.client.get(bad_url)
+                self.assertEqual(response.status_code, 403)
+
+    def test_missing_image_returns_404(self):
+        """Для несуществующей картинки возвращается 404."""
+        response = self.client.get(resize.url('posts/missing.png', 50, 40))
+        self.assertEqual(response.status_code, 404)
+
+    def test_second_request_is_served_from_disk(self):
+        """Повторный запрос отдается с диска без уменьшения."""
+        with mock.patch.object(resize, 'render',
+                               wraps=resize.render) as render:
+            for _ in range(2):
+                self.client.get(resize.url(self.name, 50, 40))
+        self.assertEqual(render.call_count, 1)
+
+    def test_concurrent_requests_resize_once(self):
+        """Одновременные запросы одного варианта уменьшают картинку
+        ровно один раз.
+        """
+        barrier = threading.Barrier(20)
+        paths = []
+
+        def request():
+            barrier.wait()
+            paths.append(resize.resized(self.name, 50, 40))
+
+        with mock.patch.object(resize, 'render',
+                               wraps=resize.render) as render:
+            threads = [threading.Thread(target=request) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(len(set(paths)), 1)
@@ -0,0 +1,118 @@
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..caching import generation
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        SearchTest.user = User.objects.create(username='test_user')
+        SearchTest.group = Group.objects.create(
+            title='Котики',
+            slug='cats',
+            description='Описание группы'
+        )
+        SearchTest.post = Post.objects.create(
+            text='Рыжий кот спит на подоконнике',
+            author=SearchTest.user,
+            group=SearchTest.group
+        )
+        Post.objects.create(text='Про собак', author=SearchTest.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query):
+        response = self.guest_client.get(reverse('search'), {'q': query})
+        return [post.id for post in response.context['page']]
+
+    def test_search_by_text_author_and_group(self):
+        """Пост находится по словам текста, автору и группе."""
+        for query in ('рыжий', 'подоконн', 'test_user кот', 'Котики'):
+            with self.subTest(query=query):
+                self.assertIn(SearchTest.post.id, self.search(query))
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при редактировании и удалении поста."""
+        post = Post.objects.create(text='Первая версия',
+                                   author=SearchTest.user)
+        post.text = 'Исправленная версия'
+        post.save()
+        self.assertEqual(self.search('первая'), [])
+        self.assertEqual(self.search('исправленная'), [post.id])
+        post.delete()
+        self.assertEqual(self.search('исправленная'), [])
+
+    def test_group_rename_reindexes_posts(self):
+        """Переименование группы попадает в индекс."""
+        SearchTest.group.title = 'Кошки'
+        SearchTest.group.save()
+        self.assertEqual(self.search('Кошки'), [SearchTest.post.id])
+
+    def test_group_delete_resets_posts(self):
+        """Удаление группы убирает ее название из индекса, меняет версии
+        ее постов и сбрасывает ленты с ними.
+        """
+        group = Group.objects.create(title='Попугаи', slug='parrots')
+        post = Post.objects.create(text='Зеленый попугай',
+                                   author=SearchTest.user, group=group)
+        scopes = ('index', f'author:{SearchTest.user.pk}')
+        feeds = generation(*scopes)
+        self.assertEqual(self.search('Попугаи'), [post.id])
+        group.delete()
+        self.assertEqual(self.search('Попугаи'), [])
+        self.assertEqual(Post.objects.get(pk=post.pk).version,
+                         post.version + 1)
+        self.assertNotEqual(generation(*scopes), feeds)
+
+    def test_only_username_change_touches_author_posts(self):
+        """Смена пароля не переиндексирует посты автора и не меняет их
+        версии, а смена логина - да.
+        """
+        user = User.objects.get(pk=SearchTest.user.pk)
+        version = Post.objects.get(pk=SearchTest.post.pk).version
+        user.set_password('new-password-123')
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual(Post.objects.get(pk=SearchTest.post.pk).version,
+                         version)
+        user.username = 'renamed_user'
+        user.save()
+        self.assertEqual(self.search('renamed_user кот'),
+                         [SearchTest.post.id])
+        self.assertGreater(Post.objects.get(pk=SearchTest.post.pk).version,
+                           version)
+
+    def test_search_is_cursor_paginated(self):
+        """Результаты поиска листаются курсором без пропусков."""
+        posts = [Post.objects.create(text=f'пагинация {i}',
+                                     author=SearchTest.user)
+                 for i in range(12)]
+        response = self.guest_client.get(reverse('search'),
+                                         {'q': 'пагинация'})
+        page = response.context['page']
+        found = [post.id for post in page]
+        response = self.guest_client.get(
+            reverse('search'), {'q': 'пагинация', 'after': page.next_cursor})
+        found += [post.id for post in response.context['page']]
+        self.assertEqual(sorted(found), [post.id for post in posts])
+
+    def test_query_syntax_is_escaped(self):
+        """Служебные символы FTS5 в запросе не ломают страницу."""
+        response = self.guest_client.get(reverse('search'),
+                                         {'q': '"кот" AND (NOT*'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идет через индекс, а не LIKE."""
+        queryset, _ = site._registry[Post].get_search_results(
+            None, Post.objects.all(), 'рыжий')
+        self.assertNotIn('LIKE', str(queryset.query))
+        self.assertEqual(list(queryset), [SearchTest.post])
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from .. import search
+from ..models import (Comment, Follow, GroupCounter, Post, TimelineEntry,
+                      UserCounter)
+
+User = get_user_model()
+
+
+@override_settings(FEED_INBOX_LIMIT=5, FEED_PULL_THRESHOLD=10)
+class SeedTest(TestCase):
+    """Наполнение базы командой seed и замеры командой bench."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed', users=30, groups=4, posts=200, comments=300,
+                     follows=5, hot_groups=1, stdout=StringIO())
+
+    def test_rows_are_created(self):
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')).exists())
+
+    def test_counters_match_rows(self):
+        """Счетчики пересчитаны по загруженным строкам."""
+        for counter in UserCounter.objects.all():
+            with self.subTest(user=counter.pk):
+                self.assertEqual(counter.posts, Post.objects.filter(
+                    author_id=counter.pk).count())
+                self.assertEqual(counter.followers, Follow.objects.filter(
+                    author_id=counter.pk).count())
+                self.assertEqual(counter.inbox, TimelineEntry.objects.filter(
+                    user_id=counter.pk).count())
+        self.assertEqual(sum(GroupCounter.objects.values_list(
+            'posts', flat=True)), Post.objects.exclude(group=None).count())
+
+    def test_timelines_hold_recent_posts_of_pushed_authors(self):
+        """В ленте последние FEED_INBOX_LIMIT постов авторов, на которых
+        подписан пользователь, кроме популярных.
+        """
+        for follow in Follow.objects.values('user').distinct():
+            user_id = follow['user']
+            authors = [
+                author_id for author_id in Follow.objects.filter(
+                    user_id=user_id).values_list('author_id', flat=True)
+                if Follow.objects.filter(author_id=author_id).count() < 10]
+            expected = list(Post.objects.filter(author_id__in=authors)
+                            .order_by('-pub_date', '-id')
+                            .values_list('id', flat=True)[:5])
+            timeline = list(TimelineEntry.objects.filter(user_id=user_id)
+                            .order_by('-pub_date', '-post_id')
+                            .values_list('post_id', flat=True))
+            with self.subTest(user=user_id):
+                self.assertEqual(timeline, expected)
+
+    def test_posts_are_searchable(self):
+        if not search.available():
+            self.skipTest('Полнотекстовый поиск недоступен')
+        post = Post.objects.first()
+        word = post.text.split()[0]
+        found = search.filter_queryset(Post.objects.all(), word)
+        self.assertIn(post, found)
+
+    def test_bench_writes_results(self):
+        """bench замеряет страницы и пишет JSON для сравнения."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench', runs=2, warmup=0, output=output,
+                         stdout=StringIO())
+            with open(output) as results:
+                data = json.load(results)
+            out = StringIO()
+            call_command('bench', runs=2, warmup=0, views=['index'],
+                         output=output, compare=output, stdout=out)
+        self.assertIn('index: p95', out.getvalue())
+        self.assertEqual(data['rows']['posts'], 200)
+        for name, result in data['views'].items():
+            with self.subTest(url_name=name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['p50'], result['p95'])
+                self.assertLessEqual(result['p95'], result['p99'])
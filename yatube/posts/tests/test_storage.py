@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+
+from .. import counters
+from ..models import MediaFile, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   MEDIA_DELETE_GRACE=0)
+class ContentAddressedStorageTest(TransactionTestCase):
+    """Транзакционный тест: файлы удаляются после коммита."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create(username='test_user')
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Пост', author=self.user,
+            image=SimpleUploadedFile(name=name, content=content))
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом в шардах."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        parts = first.image.name.split('/')
+        self.assertEqual(parts[0], 'posts')
+        self.assertEqual(parts[1] + parts[2], parts[3][:4])
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).refs,
+                         2)
+
+    def test_file_removed_with_last_reference(self):
+        """Файл удаляется только вместе с последним постом."""
+        first = self.create_post()
+        second = self.create_post()
+        storage = first.image.storage
+        name = first.image.name
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_replaced_image_is_released(self):
+        """Замененная картинка удаляется, если на нее нет ссылок."""
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile(name='other.gif',
+                                        content=SMALL_GIF + b'\x00')
+        post.save()
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    @override_settings(MEDIA_DELETE_GRACE=600)
+    def test_reupload_survives_delete_of_last_post(self):
+        """Файл, загруженный снова до того, как новый пост взял ссылку,
+        не удаляется вместе с последним старым постом.
+        """
+        post = self.create_post()
+        storage = post.image.storage
+        name = storage.save('posts/again.gif', SimpleUploadedFile(
+            name='again.gif', content=SMALL_GIF))
+        self.assertEqual(name, post.image.name)
+        post.delete()
+        self.assertTrue(storage.exists(name))
+        second = Post.objects.create(text='Пост', author=self.user,
+                                     image=name)
+        self.assertTrue(second.image.storage.exists(second.image.name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+
+    def test_referenced_file_is_not_deleted(self):
+        """Хранилище не удаляет файл, на который ссылается пост."""
+        post = self.create_post()
+        post.image.storage.delete(post.image.name)
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_rebuild_counts_references(self):
+        """rebuild пересчитывает ссылки на файлы по постам."""
+        post = self.create_post()
+        self.create_post()
+        MediaFile.objects.all().delete()
+        counters.rebuild()
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs,
+                         2)
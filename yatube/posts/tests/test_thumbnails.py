@@ -0,0 +1,192 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CARD_GEOMETRY = '960x339'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class BackgroundThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        BackgroundThumbnailTest.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create(username='test_user'),
+            image=SimpleUploadedFile(name='thumb.gif', content=small_gif,
+                                     content_type='image/gif')
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.reset()
+
+    def get_thumbnail(self):
+        options = dict(thumbnails.GEOMETRIES)[CARD_GEOMETRY]
+        return thumbnails.BackgroundThumbnailBackend().get_thumbnail(
+            BackgroundThumbnailTest.post.image, CARD_GEOMETRY, **options)
+
+    def test_render_returns_placeholder(self):
+        """При рендере миниатюра не создается, возвращается заглушка."""
+        thumbnail = self.get_thumbnail()
+        self.assertTrue(thumbnail.pending)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+
+    def test_generated_thumbnail_is_served(self):
+        """Созданная в фоне миниатюра отдается и сбрасывает карточку."""
+        post = BackgroundThumbnailTest.post
+        options = dict(thumbnails.GEOMETRIES)[CARD_GEOMETRY]
+        task = (post.image.name,
+                ((CARD_GEOMETRY, tuple(sorted(options.items()))),))
+        thumbnails.generate(task, post.image.storage)
+        thumbnail = self.get_thumbnail()
+        self.assertFalse(getattr(thumbnail, 'pending', False))
+        self.assertTrue(thumbnail.url.startswith(settings.MEDIA_URL))
+        self.assertEqual(Post.objects.get(pk=post.pk).version,
+                         post.version + 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class LRUKVStoreTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        author = User.objects.create(username='lru_user')
+        LRUKVStoreTest.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=author,
+                image=SimpleUploadedFile(name=f'lru_{i}.gif',
+                                         content=small_gif + bytes([i]),
+                                         content_type='image/gif'))
+            for i in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.reset()
+        for post in LRUKVStoreTest.posts:
+            thumbnails.generate(
+                (post.image.name,
+                 tuple((geometry, tuple(sorted(options.items())))
+                       for geometry, options in thumbnails.variants(post))),
+                post.image.storage)
+        cache.clear()
+        default.kvstore.reset()
+
+    def variant_count(self):
+        return sum(len(thumbnails.variants(post))
+                   for post in LRUKVStoreTest.posts)
+
+    def test_prefetch_resolves_page_in_one_query(self):
+        """Миниатюры страницы находятся одним запросом к таблице."""
+        with self.assertNumQueries(1):
+            found = thumbnails.prefetch(LRUKVStoreTest.posts)
+        self.assertEqual(len(found), self.variant_count())
+        with self.assertNumQueries(0):
+            found = thumbnails.prefetch(LRUKVStoreTest.posts)
+        self.assertEqual(default.kvstore.stats()['hits'], len(found))
+
+    def test_render_hits_lru_after_prefetch(self):
+        """После prefetch тег миниатюры не обращается к хранилищу."""
+        thumbnails.prefetch(LRUKVStoreTest.posts)
+        cache.clear()
+        backend = thumbnails.BackgroundThumbnailBackend()
+        with self.assertNumQueries(0):
+            for post in LRUKVStoreTest.posts:
+                for geometry, options in thumbnails.variants(post):
+                    thumbnail = backend.get_thumbnail(post.image, geometry,
+                                                      **options)
+                    self.assertFalse(getattr(thumbnail, 'pending', False))
+
+    @override_settings(THUMBNAIL_KVSTORE_LRU_SIZE=2)
+    def test_lru_is_bounded(self):
+        """LRU не растет больше THUMBNAIL_KVSTORE_LRU_SIZE записей."""
+        thumbnails.prefetch(LRUKVStoreTest.posts)
+        stats = default.kvstore.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['misses'], self.variant_count())
+
+    def test_post_image_srcset(self):
+        """Картинка поста выводится <picture> с srcset WebP и GIF
+        без вариантов шире оригинала.
+        """
+        post = LRUKVStoreTest.posts[0]
+        html = Template('{% load post_images %}{% post_image post %}').render(
+            Context({'post': post}))
+        self.assertIn('<picture>', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('type="image/gif"', html)
+        self.assertIn(f' {post.image_width}w', html)
+        self.assertNotIn(' 640w', html)
+
+    def test_post_image_is_lazy(self):
+        """Картинка грузится лениво, с заглушкой и размерами."""
+        post = LRUKVStoreTest.posts[0]
+        html = Template('{% load post_images %}{% post_image post %}').render(
+            Context({'post': post}))
+        self.assertIn('loading="lazy"', html)
+        self.assertIn(post.image_placeholder, html)
+        self.assertIn(f'width="{post.image_width}"', html)
+
+    def test_variants_limited_by_image_width(self):
+        """Варианты шире оригинала не создаются."""
+        post = Post(image='posts/wide.jpg', image_width=1000)
+        self.assertEqual(
+            [(geometry, options['format'])
+             for geometry, options in thumbnails.variants(post)],
+            [('320x113', 'WEBP'), ('640x226', 'WEBP'), ('960x339', 'WEBP'),
+             ('320x113', 'JPEG'), ('640x226', 'JPEG'), ('960x339', 'JPEG')]
+        )
+
+    def test_backfill_variants(self):
+        """Команда создает только недостающие варианты картинок."""
+        cache.clear()
+        default.kvstore.clear()
+        out = StringIO()
+        call_command('backfill_variants', stdout=out)
+        self.assertIn(f'Создано вариантов: {self.variant_count()}',
+                      out.getvalue())
+        out = StringIO()
+        call_command('backfill_variants', stdout=out)
+        self.assertIn('Создано вариантов: 0', out.getvalue())
@@ -6,11 +6,14 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import override_settings
 from django.test.client import Client
 from django.test.testcases import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from .. import comments
 from ..models import Follow, Group, Post
 
 User = get_user_model()
@@ -284,3 +287,117 @@ class PostViewsTest(TestCase):
                     context['page'])
         posts_count = len(response)
         self.assertEqual(posts_count, 0)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        FeedQueriesTest.user = User.objects.create(username='test_user')
+        FeedQueriesTest.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Описание тестовой группы'
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def create_posts(self, count):
+        for _ in range(count):
+            post = Post.objects.create(
+                text='test text',
+                author=FeedQueriesTest.user,
+                group=FeedQueriesTest.group
+            )
+            post.comments.create(text='comment', author=FeedQueriesTest.user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не растет вместе с числом постов."""
+        urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': 'test-group'}),
+            reverse('profile', kwargs={'username': 'test_user'}),
+        )
+        self.create_posts(2)
+        small = [self.count_queries(url) for url in urls]
+        self.create_posts(8)
+        full = [self.count_queries(url) for url in urls]
+        self.assertEqual(small, full)
+
+    def test_comment_count_annotation(self):
+        """В ленту попадает число комментариев поста."""
+        self.create_posts(1)
+        post = self.guest_client.get(reverse('index')).context['page'][0]
+        self.assertEqual(post.comment_count, 1)
+
+
+class PostCommentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        PostCommentsTest.user = User.objects.create(username='test_user')
+        PostCommentsTest.post = Post.objects.create(
+            text='Тестовый текст', author=PostCommentsTest.user)
+        for number in range(comments.COMMENTS_PER_PAGE + 5):
+            commenter = User.objects.create(username=f'reader_{number}')
+            PostCommentsTest.post.comments.create(text=f'comment {number}',
+                                                  author=commenter)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        self.post_url = reverse('post', kwargs={
+            'username': 'test_user', 'post_id': PostCommentsTest.post.id})
+        self.comments_url = reverse('post_comments', kwargs={
+            'username': 'test_user', 'post_id': PostCommentsTest.post.id})
+
+    def test_post_page_shows_first_page(self):
+        """На странице поста первая страница комментариев по порядку
+        и курсор следующей.
+        """
+        response = self.guest_client.get(self.post_url)
+        page = response.context['comments']
+        self.assertEqual(len(page), comments.COMMENTS_PER_PAGE)
+        self.assertEqual(page[0].text, 'comment 0')
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertContains(response, self.comments_url)
+
+    def test_load_more_returns_rest(self):
+        """Фрагмент по курсору отдает оставшиеся комментарии, а их
+        авторы выбираются тем же запросом.
+        """
+        cursor = self.guest_client.get(self.post_url).context['next_cursor']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(self.comments_url,
+                                             {'after': cursor})
+        self.assertEqual([item.text for item in response.context['comments']],
+                         [f'comment {number}' for number in range(20, 25)])
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(len(queries), 2)
+
+    def test_first_page_is_cached(self):
+        """Первая страница комментариев берется из кэша до нового
+        комментария.
+        """
+        self.guest_client.get(self.post_url)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(self.post_url)
+        self.assertFalse(any('posts_comment' in query['sql']
+                             and 'COUNT' not in query['sql']
+                             for query in queries))
+        PostCommentsTest.post.comments.create(
+            text='new comment', author=PostCommentsTest.user)
+        response = self.guest_client.get(self.post_url)
+        self.assertEqual(response.context['comments'][0].text, 'comment 0')
+        cursor = response.context['next_cursor']
+        response = self.guest_client.get(self.comments_url, {'after': cursor})
+        self.assertEqual(response.context['comments'][-1].text,
+                         'new comment')
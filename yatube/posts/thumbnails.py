@@ -0,0 +1,190 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.images import BaseImageFile, ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Ширины вариантов Post.image для srcset; высота - по пропорциям
+# карточки 960x339. Маленькие картинки не увеличиваются: браузер
+# растянет их сам, не загружая лишних байтов.
+VARIANT_WIDTHS = (320, 640, 960, 1920)
+GEOMETRIES = tuple(
+    (f'{width}x{round(width * 339 / 960)}',
+     {'crop': 'center', 'upscale': False})
+    for width in VARIANT_WIDTHS
+)
+# Каждый вариант создается в WebP и в формате оригинала.
+VARIANT_FORMAT = 'WEBP'
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+    return _executor
+
+
+def schedule(image, geometries):
+    """Ставит генерацию миниатюр geometries картинки одной задачей
+    в очередь после коммита транзакции.
+
+    Повторные запросы тех же миниатюр, пока они готовятся,
+    игнорируются.
+    """
+    task = (image.name, tuple((geometry, tuple(sorted(options.items())))
+                              for geometry, options in geometries))
+    storage = image.storage
+
+    def submit():
+        with _executor_lock:
+            if task in _in_flight:
+                return
+            _in_flight.add(task)
+        if settings.THUMBNAIL_WORKERS:
+            executor().submit(generate, task, storage, True)
+        else:
+            generate(task, storage)
+
+    transaction.on_commit(submit)
+
+
+def variants(post):
+    """Миниатюры картинки поста: (geometry, options) для каждой ширины
+    VARIANT_WIDTHS в WebP и в формате оригинала.
+
+    Варианты шире оригинала не создаются, кроме самого узкого.
+    """
+    formats = [VARIANT_FORMAT]
+    original = ThumbnailBackend()._get_format(ImageFile(post.image))
+    if original != VARIANT_FORMAT:
+        formats.append(original)
+    geometries = [
+        (geometry, options) for (geometry, options), width
+        in zip(GEOMETRIES, VARIANT_WIDTHS)
+        if width == VARIANT_WIDTHS[0] or post.image_width is None
+        or width <= post.image_width
+    ]
+    return [(geometry, {**options, 'format': format_})
+            for format_ in formats for geometry, options in geometries]
+
+
+def schedule_post(post):
+    """Ставит в очередь все миниатюры картинки поста."""
+    if post.image:
+        schedule(post.image, variants(post))
+
+
+def generate(task, storage, worker=False):
+    """Создает миниатюры задачи и один раз сбрасывает карточки постов
+    с этой картинкой, чтобы заглушка сменилась миниатюрами.
+
+    В рабочем потоке (worker) соединение с базой закрывается.
+    """
+    name, geometries = task
+    try:
+        source = ImageFile(name, storage)
+        for geometry, options in geometries:
+            ThumbnailBackend().get_thumbnail(source, geometry,
+                                             **dict(options))
+        posts = Post.objects.filter(image=name)
+        scopes = set()
+        for post in posts.only('author_id', 'group_id'):
+            scopes.update(caching.post_scopes(post))
+        posts.update(version=F('version') + 1)
+        caching.bump(*scopes)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', name)
+    finally:
+        with _executor_lock:
+            _in_flight.discard(task)
+        if worker:
+            connection.close()
+
+
+def prefetch(posts):
+    """Находит все готовые миниатюры картинок постов страницы одним
+    пакетным обращением к KVStore, чтобы теги картинок
+    в карточках брали их из LRU процесса.
+    """
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'get_many'):
+        return {}
+    backend = BackgroundThumbnailBackend()
+    thumbnails = []
+    for post in posts:
+        if post.image:
+            source = ImageFile(post.image)
+            for geometry, options in variants(post):
+                thumbnails.append(ImageFile(
+                    backend.thumbnail_name(source, geometry, dict(options)),
+                    default.storage))
+    if not thumbnails:
+        return {}
+    return kvstore.get_many(thumbnails)
+
+
+class PendingThumbnail(BaseImageFile):
+    """Миниатюра, которая еще готовится: шаблон показывает заглушку."""
+    pending = True
+    url = None
+
+    def __init__(self, geometry_string):
+        self.size = parse_geometry(geometry_string)
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который никогда не уменьшает картинку
+    в потоке запроса: готовая миниатюра берется из KVStore, а
+    отсутствующая ставится в очередь рабочих потоков.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        cached = self.lookup(file_, geometry_string, options)
+        if cached:
+            return cached
+        schedule(ImageFile(file_), [(geometry_string, options)])
+        return PendingThumbnail(geometry_string)
+
+    def lookup(self, file_, geometry_string, options):
+        """Готовая миниатюра из KVStore или None, без постановки
+        в очередь.
+        """
+        source = ImageFile(file_)
+        thumbnail = ImageFile(
+            self.thumbnail_name(source, geometry_string, dict(options)),
+            default.storage)
+        return default.kvstore.get(thumbnail)
+
+    def thumbnail_name(self, source, geometry_string, options):
+        """Имя файла миниатюры с теми же умолчаниями, что у sorl."""
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(thumbnail_defaults, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
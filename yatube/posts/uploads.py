@@ -0,0 +1,185 @@
+import base64
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые принимаются для Post.image.
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Форматы, которые перекодируются при сохранении; GIF остается как
+# есть, чтобы не потерять анимацию.
+NORMALIZED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+# Метаданные, которые не переносятся в нормализованную картинку.
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment',
+                 'photoshop')
+# Заглушка картинки: длинная сторона в пикселях и качество JPEG.
+PLACEHOLDER_SIDE = 16
+PLACEHOLDER_QUALITY = 40
+
+
+def max_bytes():
+    return getattr(settings, 'POST_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def max_pixels():
+    return getattr(settings, 'POST_IMAGE_MAX_PIXELS', 25 * 1000 * 1000)
+
+
+def max_side():
+    return getattr(settings, 'POST_IMAGE_MAX_SIDE', 2560)
+
+
+def quality():
+    return getattr(settings, 'POST_IMAGE_QUALITY', 85)
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    """Пишет каждую загрузку во временный файл кусками, не держа ее
+    в памяти. Данные сверх POST_IMAGE_MAX_BYTES не сохраняются, а только
+    считаются: у файла остается полный size, по которому форма его
+    отклонит.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= max_bytes():
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+
+def check_image(upload):
+    """Проверяет загруженную картинку по размеру файла и заголовку.
+
+    Пиксели не декодируются: Image.open читает только заголовок,
+    поэтому decompression bomb отклоняется до распаковки.
+    Возвращает (формат, ширина, высота).
+    """
+    if upload.size > max_bytes():
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.', code='file_too_large',
+            params={'limit': max_bytes() // (1024 * 1024)})
+    if hasattr(upload, 'temporary_file_path'):
+        source = upload.temporary_file_path()
+    else:
+        source = upload
+        upload.seek(0)
+    too_many_pixels = ValidationError(
+        'Изображение больше %(limit)d мегапикселей.',
+        code='too_many_pixels',
+        params={'limit': max_pixels() // (1000 * 1000)})
+    try:
+        with Image.open(source) as image:
+            format_, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        raise too_many_pixels
+    except Exception:
+        raise ValidationError('Загрузите правильное изображение.',
+                              code='invalid_image')
+    finally:
+        if source is upload:
+            upload.seek(0)
+    if width * height > max_pixels():
+        raise too_many_pixels
+    if format_ not in IMAGE_FORMATS:
+        raise ValidationError('Неподдерживаемый формат изображения.',
+                              code='invalid_format')
+    return format_, width, height
+
+
+def normalize(file):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIDE по длинной стороне,
+    убирает метаданные (EXIF, текстовые блоки; поворот из EXIF
+    применяется к пикселям) и перекодирует ее в том же формате
+    с качеством POST_IMAGE_QUALITY.
+
+    Возвращает новые байты или None, если картинку лучше оставить
+    как есть: формат не перекодируется или выигрыша нет.
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            format_ = image.format
+            if (format_ not in NORMALIZED_FORMATS
+                    or getattr(image, 'is_animated', False)):
+                return None
+            # JPEG сразу декодируется в уменьшенном масштабе.
+            image.draft('RGB', (max_side(), max_side()))
+            metadata = any(key in image.info for key in METADATA_KEYS)
+            icc_profile = image.info.get('icc_profile')
+            image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        # Не картинка: форма такое не пропустит, а прочие пути
+        # сохраняют файл как есть.
+        return None
+    finally:
+        file.seek(0)
+    resized = max(image.size) > max_side()
+    if resized:
+        image.thumbnail((max_side(), max_side()), Image.LANCZOS)
+    params = {'optimize': True}
+    if format_ == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        params.update(quality=quality(), progressive=True)
+    elif format_ == 'WEBP':
+        params['quality'] = quality()
+    if icc_profile:
+        params['icc_profile'] = icc_profile
+    buffer = BytesIO()
+    image.save(buffer, format_, **params)
+    data = buffer.getvalue()
+    if not resized and not metadata and len(data) >= file.size:
+        return None
+    return data
+
+
+def normalize_field(field_file):
+    """Подменяет содержимое еще не сохраненного FieldFile
+    нормализованной картинкой и пишет в лог, сколько байтов
+    сэкономлено.
+    """
+    before = field_file.size
+    data = normalize(field_file)
+    if data is None:
+        return
+    field_file.file = ContentFile(data, name=field_file.name)
+    logger.info('Картинка %s нормализована: %d -> %d байт, '
+                'сэкономлено %d', field_file.name, before, len(data),
+                before - len(data))
+
+
+def placeholder(file):
+    """Крошечная размытая копия картинки для показа, пока грузится
+    сама картинка: data URI JPEG на несколько сотен байт.
+
+    Для файла, который не открывается как картинка, - пустая строка.
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            image.draft('RGB', (PLACEHOLDER_SIDE, PLACEHOLDER_SIDE))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        return ''
+    finally:
+        file.seek(0)
+    image.thumbnail((PLACEHOLDER_SIDE, PLACEHOLDER_SIDE), Image.LANCZOS)
+    image = image.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    data = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return f'data:image/jpeg;base64,{data}'
@@ -1,11 +1,24 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, resize, views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path(f'{settings.MEDIA_URL.lstrip("/")}{resize.CACHE_DIR}/'
+         f'<int:width>x<int:height>/<path:name>',
+         views.resized_image, name='resized_image'),
+    path('api/', api.index, name='api_index'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_posts'),
+    path('api/<str:username>/', api.profile, name='api_profile'),
+    path('api/<str:username>/<int:post_id>/', api.post_view,
+         name='api_post'),
+    path('api/<str:username>/<int:post_id>/comments/', api.post_comments,
+         name='api_post_comments'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
@@ -13,6 +26,8 @@ urlpatterns = [
          name='post_edit'),
     path('<str:username>/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('<str:username>/unfollow/', views.profile_unfollow,
@@ -1,70 +1,146 @@
+import mimetypes
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import comments, resize, thumbnails
+from .conditional import feed_condition
+from .feed import TimelineFeed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Follow, Group, GroupCounter, Post, User, UserCounter
+from .paginator import paginate
+from .search import SearchResults, available, filter_queryset
 
 User = get_user_model()
 
+POSTS_PER_PAGE = 10
+# Уменьшенная картинка по ссылке не меняется: имя - хэш содержимого.
+RESIZED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def index_scopes():
+    return ['index']
+
+
+def group_scopes(slug):
+    group_id = (Group.objects.filter(slug=slug)
+                .values_list('id', flat=True).first())
+    return group_id and [f'group:{group_id}']
+
+
+def author_scopes(username, post_id=None):
+    author_id = (User.objects.filter(username=username)
+                 .values_list('id', flat=True).first())
+    return author_id and [f'author:{author_id}']
 
+
+@feed_condition(index_scopes)
 def index(request):
     """View-функция главной страницы.
     Выводит по 10 записей из всей базы
     """
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'index.html', {'page': page})
+    post_list = Post.objects.for_feed()
+    page = paginate(request, post_list, POSTS_PER_PAGE)
+    context = {'page': page, 'generation': request.feed_generation}
+    return render(request, 'index.html', context)
 
 
+@feed_condition(group_scopes)
 def group_posts(request, slug):
     """View-функция группы.
     Выводит по 10 записей выбранной группы slug
     """
     group = get_object_or_404(Group, slug=slug)
-    posts_list = group.posts.all()
-    paginator = Paginator(posts_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'group': group, 'page': page}
+    posts_list = group.posts.for_feed()
+    page = paginate(request, posts_list, POSTS_PER_PAGE)
+    context = {'group': group, 'page': page,
+               'counter': GroupCounter.for_group(group),
+               'generation': request.feed_generation}
     return render(request, 'group.html', context)
 
 
+@feed_condition(author_scopes)
 def profile(request, username):
     """View-функция профиля.
     Выводит по 10 записей выбранного пользователя
     """
     author = get_object_or_404(User, username=username)
-    posts_list = author.posts.all()
-    count_posts = posts_list.count()
-    paginator = Paginator(posts_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'author': author, 'page': page, 'count': count_posts,
-               'following': True}
+    posts_list = author.posts.for_feed()
+    counter = UserCounter.for_user(author)
+    page = paginate(request, posts_list, POSTS_PER_PAGE)
+    context = {'author': author, 'page': page, 'count': counter.posts,
+               'counter': counter, 'following': True,
+               'generation': request.feed_generation}
     if not request.user.is_authenticated:
         return render(request, 'profile.html', context)
     context['following'] = author.following.filter(user=request.user).exists()
     return render(request, 'profile.html', context)
 
 
+@feed_condition(author_scopes)
 def post_view(request, username, post_id):
     """View-функция поста.
     Выводит выбранный пост post_id юзера username
     """
     author = get_object_or_404(User, username=username)
-    post = get_object_or_404(author.posts.all(), pk=post_id)
-    comments = post.comments.all()
-    count = author.posts.count()
+    post = get_object_or_404(author.posts.for_feed(), pk=post_id)
+    comment_list, next_cursor = comments.first_page(post)
+    counter = UserCounter.for_user(author)
     form = CommentForm(request.POST or None)
-    context = {'post': post, 'author': author, 'count': count, 'form': form,
-               'comments': comments}
+    context = {'post': post, 'author': author, 'count': counter.posts,
+               'counter': counter, 'form': form, 'comments': comment_list,
+               'next_cursor': next_cursor}
     return render(request, 'post.html', context)
 
 
+def post_comments(request, username, post_id):
+    """View-функция следующей страницы комментариев поста.
+    Отдает фрагмент HTML для кнопки «Показать еще»
+    """
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             author__username=username, pk=post_id)
+    comment_list, next_cursor = comments.get_page(
+        post, after=request.GET.get('after'))
+    context = {'post': post, 'comments': comment_list,
+               'next_cursor': next_cursor}
+    return render(request, 'includes/comment_list.html', context)
+
+
+def search(request):
+    """View-функция поиска.
+    Выводит по 10 записей, найденных по запросу q, по релевантности
+    """
+    query = request.GET.get('q', '').strip()
+    if available():
+        page = paginate(request, SearchResults(query), POSTS_PER_PAGE,
+                        ordering=SearchResults.ordering)
+    else:
+        page = paginate(request,
+                        filter_queryset(Post.objects.for_feed(), query),
+                        POSTS_PER_PAGE)
+    return render(request, 'search.html', {'page': page, 'query': query})
+
+
+def resized_image(request, width, height, name):
+    """View-функция картинки поста, уменьшенной до width x height.
+    Параметры подписаны (см. resize.url); готовая картинка
+    отдается с диска, при первом запросе - создается.
+    """
+    if not resize.is_valid(width, height, name, request.GET.get('s')):
+        return HttpResponseForbidden()
+    try:
+        path = resize.resized(name, width, height)
+    except (FileNotFoundError, SuspiciousFileOperation):
+        raise Http404
+    response = FileResponse(open(path, 'rb'),
+                            content_type=mimetypes.guess_type(path)[0])
+    response['Cache-Control'] = RESIZED_CACHE_CONTROL
+    return response
+
+
 @login_required
 def add_comment(request, username, post_id):
     author = get_object_or_404(User, username=username)
@@ -90,6 +166,7 @@ def new_post(request):
     new_post = form.save(commit=False)
     new_post.author = request.user
     new_post.save()
+    thumbnails.schedule_post(new_post)
     return redirect('index')
 
 
@@ -107,7 +184,9 @@ def post_edit(request, username, post_id):
     if not form.is_valid():
         return render(request, 'new.html',
                       {'form': form, 'post': post, 'new_post': False})
-    form.save()
+    post = form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule_post(post)
     return redirect('post', username, post_id)
 
 
@@ -116,10 +195,7 @@ def follow_index(request):
     """"Функция для отображения страницы подписок.
     Выводятся все посты авторов, на которых подписан юзер
     """
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, TimelineFeed(request.user), POSTS_PER_PAGE)
     return render(request, 'follow.html', {'page': page})
 
 
@@ -1,12 +1,42 @@
+from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import get_resolver
 
 User = get_user_model()
 
 
+def reserved_usernames():
+    """Первые части адресов сайта (api, search, admin...): у
+    пользователя с таким логином адрес профиля занят другой страницей.
+    """
+    names = set()
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern).lstrip('^')
+            if hasattr(pattern, 'url_patterns'):
+                walk(pattern.url_patterns, route)
+                continue
+            first = route.split('/')[0]
+            if first and '<' not in first and '(' not in first:
+                names.add(first.rstrip('$').lower())
+
+    walk(get_resolver().url_patterns, '')
+    return names
+
+
 class CreationForm(UserCreationForm):
     """Класс для формы регистрации"""
     class Meta(UserCreationForm.Meta):
         """Наследуется вложенный класс"""
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if username.lower() in reserved_usernames():
+            raise forms.ValidationError(
+                'Этот логин занят адресом страницы сайта',
+                code='reserved_username')
+        return username
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+User = get_user_model()
+
+
+class SignUpTest(TestCase):
+    def setUp(self):
+        self.guest_client = Client()
+
+    def signup(self, username):
+        return self.guest_client.post(reverse('signup'), {
+            'username': username,
+            'password1': 'Sup3r-secret-pass',
+            'password2': 'Sup3r-secret-pass',
+        })
+
+    def test_reserved_usernames_are_rejected(self):
+        """Логин, совпадающий с адресом страницы сайта, не принимается:
+        профиль такого пользователя был бы недоступен.
+        """
+        for username in ('api', 'search', 'Admin'):
+            with self.subTest(username=username):
+                response = self.signup(username)
+                self.assertEqual(response.status_code, 200)
+                errors = response.context['form'].errors.as_data()
+                self.assertEqual(errors['username'][0].code,
+                                 'reserved_username')
+                self.assertFalse(User.objects.filter(
+                    username=username).exists())
+
+    def test_regular_username_is_accepted(self):
+        response = self.signup('apiary')
+        self.assertRedirects(response, reverse('login'))
+        self.assertTrue(User.objects.filter(username='apiary').exists())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -37,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.metrics.MetricsMiddleware',
+    'posts.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -137,3 +140,49 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Лента подписок: максимальное число записей в ленте одного пользователя
+FEED_INBOX_LIMIT = 1000
+# Посты авторов с таким числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении (None - раскладывать всегда)
+FEED_PULL_THRESHOLD = 10000
+# Посты автора, у которого подписчиков стало меньше этого числа, снова
+# раскладываются по лентам командой push_feeds (по расписанию)
+FEED_PUSH_THRESHOLD = 9000
+
+# Миниатюры sorl-thumbnail создаются в фоновых потоках, а не при рендере
+THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+# Число рабочих потоков (0 - создавать сразу, в том же потоке)
+THUMBNAIL_WORKERS = 2
+# KVStore миниатюр с LRU в памяти процесса перед кэшем и базой
+THUMBNAIL_KVSTORE = 'posts.kvstore.LRUKVStore'
+# Сколько записей KVStore держать в LRU одного процесса
+THUMBNAIL_KVSTORE_LRU_SIZE = 10000
+# Загрузки пишутся во временный файл кусками, а не в память
+FILE_UPLOAD_HANDLERS = ['posts.uploads.StreamingUploadHandler']
+# Лимиты картинки поста: размер файла и число пикселей по заголовку
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 25 * 1000 * 1000
+# Нормализация картинки поста при сохранении: длинная сторона и качество
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_QUALITY = 85
+# Картинка без ссылок, сохраненная меньше этого числа секунд назад,
+# не удаляется сразу, а остается сборщику collect_media
+MEDIA_DELETE_GRACE = 600
+# Уменьшение картинок по подписанной ссылке: наибольшая сторона
+RESIZE_MAX_SIDE = 1920
+# Профилирование запросов: заголовок Server-Timing с временем SQL,
+# шаблонов и кэша для адресов METRICS_ALLOWED_NETWORKS (или по токену
+# METRICS_TOKEN) и персонала (False - middleware отключается при запуске)
+PROFILING_ENABLED = True
+# Доля запросов, замеры которых пишутся в журнал posts.profiling (INFO)
+PROFILING_LOG_SAMPLE_RATE = 0.01
+# Метрики /metrics: адреса, с которых они доступны, прокси, за которым
+# адрес клиента берется из X-Forwarded-For, токен для заголовка
+# Authorization: Bearer, каталог, куда процессы пишут свои счетчики,
+# и как часто (в секундах) они пишутся
+METRICS_ALLOWED_NETWORKS = ('127.0.0.0/8', '::1/128')
+METRICS_TRUSTED_PROXIES = ('127.0.0.0/8', '::1/128')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+METRICS_FLUSH_INTERVAL = 1.0
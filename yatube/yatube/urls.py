@@ -4,6 +4,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from posts import metrics
+
 handler404 = 'posts.views.page_not_found'
 handler500 = 'posts.views.server_error'
 
@@ -17,6 +19,9 @@ urlpatterns = [
     # раздел администратора
     path('admin/', admin.site.urls),
 
+    # метрики для Prometheus
+    path('metrics', metrics.export, name='metrics'),
+
     # обработчик ищет в posts
     path('', include('posts.urls')),
 